@@ -0,0 +1,154 @@
+"""
+Drive SwipeCapture with synthetic bursts of swipes and profiles
+and check that every swipe is recorded against the right profile,
+including scraped cards that share a name or are swiped before
+they were parsed.
+
+run from the repository root: python -m benchmarks.capture_stress
+"""
+
+import argparse
+import queue
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from loguru import logger
+
+from capture import SwipeCapture
+from common import SwipeAction, SwipeEvent
+
+
+def _summary(recorded, expected, started) -> dict:
+    # expected is the uuid of every swipe and the profile it should get, if any
+    mismatched = sum(
+        1
+        for (event, profile), (uuid, profile_uuid) in zip(recorded, expected)
+        if (profile.image_urls[0] if profile else None) != profile_uuid
+    )
+    return {
+        "swipes": len(expected),
+        "recorded": len(recorded),
+        "mismatched": mismatched,
+        "in_order": [event.profile_uuid for event, _ in recorded]
+        == [uuid for uuid, _ in expected],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_by_uuid(n_swipes: int, burst: int, jitter: float) -> dict:
+    recorded = []
+    capture = SwipeCapture(
+        lambda event, profile: recorded.append((event, profile)), grace=1
+    )
+
+    uuids = [f"{i:024x}" for i in range(n_swipes)]
+
+    def feed_profiles():
+        # profiles arrive slightly out of step with swipes, as a parser would deliver them
+        for uuid in uuids:
+            time.sleep(random.uniform(0, jitter))
+            capture.add_profile(SimpleNamespace(name=uuid, image_urls=[uuid]), uuid)
+
+    def feed_events():
+        for start in range(0, n_swipes, burst):
+            for uuid in uuids[start : start + burst]:
+                action = random.choice(list(SwipeAction))
+                capture.add_event(SwipeEvent(profile_uuid=uuid, action=action))
+            time.sleep(random.uniform(0, jitter * burst))
+
+    started = time.perf_counter()
+    feeders = [
+        threading.Thread(target=feed_profiles),
+        threading.Thread(target=feed_events),
+    ]
+    for feeder in feeders:
+        feeder.start()
+    for feeder in feeders:
+        feeder.join()
+    capture.close()
+    return _summary(recorded, [(uuid, uuid) for uuid in uuids], started)
+
+
+def run_scraped(
+    n_swipes: int, jitter: float, same_names: float, skipped: float
+) -> dict:
+    """
+    Cards scraped from the page, without uuids. The parser delivers each
+    card some time after it was shown, sometimes after it was swiped.
+    `same_names` is the share of cards named like the card before them,
+    `skipped` the share swiped before they were parsed at all
+    """
+    recorded = []
+    capture = SwipeCapture(
+        lambda event, profile: recorded.append((event, profile)), grace=1
+    )
+
+    parsed = queue.Queue()
+    expected = []
+
+    def parse_cards():
+        while (card := parsed.get()) is not None:
+            shown, profile = card
+            time.sleep(random.uniform(0, jitter))
+            capture.add_profile(profile, shown=shown)
+
+    def swipe_cards():
+        name = "card"
+        for i in range(n_swipes):
+            uuid = f"{i:024x}"
+            if random.random() >= same_names:
+                name = uuid
+            shown = time.monotonic()
+            if random.random() < skipped:
+                expected.append((uuid, None))
+            else:
+                profile = SimpleNamespace(name=name, image_urls=[uuid])
+                parsed.put((shown, profile))
+                expected.append((uuid, uuid))
+
+            time.sleep(random.uniform(jitter / 2, jitter * 2))
+            action = random.choice(list(SwipeAction))
+            capture.add_event(SwipeEvent(profile_uuid=uuid, action=action))
+        parsed.put(None)
+
+    started = time.perf_counter()
+    feeders = [
+        threading.Thread(target=parse_cards),
+        threading.Thread(target=swipe_cards),
+    ]
+    for feeder in feeders:
+        feeder.start()
+    for feeder in feeders:
+        feeder.join()
+    capture.close()
+    return _summary(recorded, expected, started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="capture_stress")
+    parser.add_argument("--swipes", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=8, help="swipes per burst")
+    parser.add_argument(
+        "--jitter", type=float, default=0.002, help="max delay between items, seconds"
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    failed = False
+    results = {
+        "by uuid": run_by_uuid(args.swipes, args.burst, args.jitter),
+        "scraped": run_scraped(args.swipes, args.jitter, same_names=0, skipped=0),
+        "scraped, same names": run_scraped(
+            args.swipes, args.jitter, same_names=0.3, skipped=0
+        ),
+        "scraped, skipped cards": run_scraped(
+            args.swipes, args.jitter, same_names=0.3, skipped=0.1
+        ),
+    }
+    for name, result in results.items():
+        print(f"{name}: {result}")
+        failed |= result["recorded"] != args.swipes or result["mismatched"] > 0
+
+    raise SystemExit(failed)
@@ -0,0 +1,76 @@
+"""
+Measure image pipeline throughput on synthetic profile photos,
+with a single worker process and with one per core.
+
+run from the repository root: python -m benchmarks.image_pipeline [--images N]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+from pathlib import Path
+
+from loguru import logger
+from PIL import Image, ImageDraw
+
+from image_pipeline import ImagePipeline
+from image_store import ImageStore
+
+
+def photo(width: int, height: int) -> bytes:
+    """
+    A noisy image roughly the size of a full resolution profile photo
+    """
+    img = Image.effect_noise((width, height), 40).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(20):
+        x, y = random.randrange(width), random.randrange(height)
+        draw.ellipse(
+            (x, y, x + width // 4, y + height // 4),
+            fill=tuple(random.randrange(256) for _ in range(3)),
+        )
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def run(workers: int, folder: Path) -> dict:
+    store = ImageStore(folder)
+    pipeline = ImagePipeline(store, workers=workers)
+    try:
+        return pipeline.backfill(force=True)
+    finally:
+        pipeline.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="image_pipeline")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=1350)
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmarks/results/image_pipeline.json")
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        store = ImageStore(folder)
+        for i in range(args.images):
+            store.put(f"profile-{i}", 0, photo(args.width, args.height))
+        store.close()
+
+        results = {
+            f"workers={workers}": run(workers, folder)
+            for workers in sorted({1, os.cpu_count() or 1})
+        }
+
+    print(json.dumps(results, indent=2))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
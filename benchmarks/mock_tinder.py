@@ -0,0 +1,364 @@
+"""
+Local stand-in for the Tinder web app, its API and image CDN.
+
+The page renders cards from /v2/recs/core with the structure of the live card
+(photo as a css background-image, itemprop name and age), swipes with the
+arrow keys or the buttons and sends them to /like, /pass or /superlike like
+the real app does. Like the real page it loads a web font, an analytics
+script and the photos from the image CDN host, so resource blocking
+can be measured. Chrome is pointed at it with --host-resolver-rules,
+the API is served over https with a throwaway self-signed certificate.
+
+run from the repository root: python -m benchmarks.mock_tinder [--port 8600]
+"""
+
+import argparse
+import functools
+import io
+import json
+import random
+import re
+import ssl
+import subprocess
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from requests.adapters import HTTPAdapter
+
+NAMES = ["Alex", "Sam", "Robin", "Jamie", "Charlie", "Kim", "Morgan", "Taylor"]
+
+# hosts chrome has to resolve to the mock servers
+PAGE_HOST = "tinder.com"
+API_HOST = "api.gotinder.com"
+IMAGE_HOST = "images-ssl.gotinder.com"
+TRACKER_HOST = "www.google-analytics.com"
+
+# sizes of the static assets, in the range of the real ones
+FONT_BYTES = 60_000
+TRACKER_BYTES = 50_000
+
+PAGE = """<!doctype html>
+<html>
+<head>
+  <meta charset="UTF-8"><title>Tinder</title>
+  <style>
+    @font-face { font-family: "Proxima"; src: url("/static/app.woff2") format("woff2"); }
+    body { font-family: "Proxima", sans-serif; }
+  </style>
+  <script async src="http://TRACKER_HOST/analytics.js"></script>
+</head>
+<body>
+  <main class="recsCardboard">
+    <div class="recsCardboard__cards" id="cards"></div>
+    <div class="recsCardboard__buttons">
+      <button type="button" data-action="pass">Nope</button>
+      <button type="button" data-action="superlike">Super Like</button>
+      <button type="button" data-action="like">Like</button>
+    </div>
+  </main>
+  <script>
+    const api = "https://API_HOST";
+    const cards = document.getElementById("cards");
+    let deck = [];
+    let loading = null;
+
+    function render() {
+      const profile = deck[0];
+      if (!profile) {
+        cards.innerHTML = "<p class='empty'>no more profiles</p>";
+        return;
+      }
+      cards.innerHTML = `
+        <div class="Expand recCard" data-uuid="${profile._id}">
+          <div class="profileCard__slider">
+            ${profile.photos.map((photo, i) => `
+              <div class="Bdrs(8px) Bgz(cv) Bgp(c) StretchedBox" role="img"
+                   aria-label="${profile.name} photo ${i + 1}"
+                   style='background-image: url("${photo.url}");'></div>`).join("")}
+          </div>
+          <div class="profileCard__info">
+            <span itemprop="name">${profile.name}</span>
+            <span itemprop="age">${profile.age}</span>
+            <div class="profileCard__bio">${profile.bio}</div>
+          </div>
+        </div>`;
+    }
+
+    function load() {
+      loading = loading || fetch(`${api}/v2/recs/core?locale=en`)
+        .then((response) => response.json())
+        .then((payload) => {
+          deck.push(...payload.data.results.map((result) => ({
+            ...result.user,
+            age: new Date().getFullYear() - new Date(result.user.birth_date).getFullYear(),
+          })));
+          loading = null;
+          render();
+        });
+      return loading;
+    }
+
+    function swipe(action) {
+      const profile = deck.shift();
+      if (!profile) return;
+      fetch(`${api}/${action}/${profile._id}?locale=en`, { method: "POST" });
+      render();
+      if (deck.length < 3) load();
+    }
+
+    document.querySelectorAll("[data-action]").forEach((button) =>
+      button.addEventListener("click", () => swipe(button.dataset.action))
+    );
+    document.addEventListener("keydown", (event) => {
+      const action = { ArrowLeft: "pass", ArrowRight: "like", Enter: "superlike" }[event.key];
+      if (action) swipe(action);
+    });
+    load();
+  </script>
+</body>
+</html>
+"""
+
+
+class MockTinder:
+    """
+    Serve the page and images over http and the API over https,
+    counting the swipes the API received
+    """
+
+    def __init__(
+        self,
+        port: int = 8600,
+        api_port: int = 8601,
+        batch: int = 10,
+        n_profiles: int = 10000,
+        photos: int = 2,
+        latency: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.port = port
+        self.api_port = api_port
+        self.batch = batch
+        self.n_profiles = n_profiles
+        self.photos = photos
+        self.latency = latency
+        self.random = random.Random(seed)
+
+        self.swipes: list[tuple[str, str]] = []
+        # response body bytes by content type
+        self.bytes_sent: Counter[str] = Counter()
+        self._next = 0
+        self._lock = threading.Lock()
+
+        handler = functools.partial(_Handler, self)
+        self.page_server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.api_server = ThreadingHTTPServer(("127.0.0.1", api_port), handler)
+        self.api_server.socket = self._tls_context().wrap_socket(
+            self.api_server.socket, server_side=True
+        )
+        self._threads = [
+            threading.Thread(target=server.serve_forever, daemon=True)
+            for server in (self.page_server, self.api_server)
+        ]
+
+    @staticmethod
+    def _tls_context() -> ssl.SSLContext:
+        # chrome runs with --ignore-certificate-errors, any certificate does
+        folder = Path(tempfile.mkdtemp(prefix="mock-tinder-"))
+        subprocess.run(
+            [
+                "openssl",
+                "req",
+                "-x509",
+                "-newkey",
+                "rsa:2048",
+                "-nodes",
+                "-days",
+                "1",
+                "-subj",
+                f"/CN={API_HOST}",
+                "-keyout",
+                str(folder / "key.pem"),
+                "-out",
+                str(folder / "cert.pem"),
+            ],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(folder / "cert.pem", folder / "key.pem")
+        return context
+
+    @property
+    def url(self) -> str:
+        return f"http://{PAGE_HOST}/"
+
+    @property
+    def chrome_arguments(self) -> list[str]:
+        return [
+            f"--host-resolver-rules=MAP {PAGE_HOST} 127.0.0.1:{self.port},"
+            f"MAP {IMAGE_HOST} 127.0.0.1:{self.port},"
+            f"MAP {TRACKER_HOST} 127.0.0.1:{self.port},"
+            f"MAP {API_HOST} 127.0.0.1:{self.api_port}",
+            "--ignore-certificate-errors",
+        ]
+
+    def image_url(self, uuid: str, position: int) -> str:
+        return f"http://{IMAGE_HOST}/images/{uuid}-{position}.jpg"
+
+    def mount(self, http):
+        """
+        Send the image CDN requests of a requests.Session to the mock,
+        for downloads made outside the browser
+        """
+        http.mount(f"http://{IMAGE_HOST}/", _LocalAdapter(f"127.0.0.1:{self.port}"))
+
+    def profile(self, index: int) -> dict:
+        uuid = f"{index:024x}"
+        return {
+            "type": "user",
+            "distance_mi": self.random.randint(1, 50),
+            "user": {
+                "_id": uuid,
+                "name": self.random.choice(NAMES),
+                "birth_date": f"{self.random.randint(1980, 2004)}-06-15T00:00:00.000Z",
+                "bio": "offline benchmark profile",
+                "photos": [
+                    {"url": self.image_url(uuid, position)}
+                    for position in range(self.photos)
+                ],
+            },
+        }
+
+    def recommendations(self) -> dict:
+        with self._lock:
+            start = self._next
+            self._next = min(start + self.batch, self.n_profiles)
+            results = [self.profile(index) for index in range(start, self._next)]
+        return {"meta": {"status": 200}, "data": {"results": results}}
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def image(name: str) -> bytes:
+        # every profile gets distinct content, so the image store can't dedupe it
+        from PIL import Image, ImageDraw
+
+        seed = random.Random(name)
+        img = Image.new("RGB", (640, 800), tuple(seed.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = seed.randrange(640), seed.randrange(800)
+            draw.rectangle(
+                (x, y, x + 120, y + 160),
+                fill=tuple(seed.randrange(256) for _ in range(3)),
+            )
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=85)
+        return buffer.getvalue()
+
+    @staticmethod
+    @functools.cache
+    def asset(size: int) -> bytes:
+        # a comment parses as a script, and is a font that fails to decode
+        return b"/*" + b"0" * (size - 4) + b"*/"
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        for server in (self.page_server, self.api_server):
+            server.shutdown()
+            server.server_close()
+
+
+class _LocalAdapter(HTTPAdapter):
+    def __init__(self, address: str) -> None:
+        super().__init__()
+        self.address = address
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(IMAGE_HOST, self.address, 1)
+        return super().send(request, **kwargs)
+
+
+SWIPE_PATH = re.compile(r"^/(?P<action>like|pass|superlike)/(?P<uuid>[a-z0-9]+)$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def __init__(self, mock: MockTinder, *args, **kwargs) -> None:
+        self.mock = mock
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+        with self.mock._lock:
+            self.mock.bytes_sent[content_type] += len(body)
+
+    def _json(self, payload: dict):
+        self._send(200, json.dumps(payload).encode(), "application/json")
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST")
+        self.send_header("Access-Control-Allow-Headers", "*")
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/":
+            page = PAGE.replace("API_HOST", API_HOST).replace(
+                "TRACKER_HOST", TRACKER_HOST
+            )
+            self._send(200, page.encode(), "text/html")
+        elif path == "/v2/recs/core":
+            self._json(self.mock.recommendations())
+        elif path.startswith("/images/"):
+            self._send(200, self.mock.image(path.rsplit("/", 1)[1]), "image/jpeg")
+        elif path == "/static/app.woff2":
+            self._send(200, self.mock.asset(FONT_BYTES), "font/woff2")
+        elif path == "/analytics.js":
+            self._send(200, self.mock.asset(TRACKER_BYTES), "application/javascript")
+        elif SWIPE_PATH.match(path):
+            self.do_POST()
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        if not (swipe := SWIPE_PATH.match(self.path.split("?")[0])):
+            self._send(404, b"not found", "text/plain")
+            return
+
+        if self.mock.latency:
+            threading.Event().wait(self.mock.latency)
+        with self.mock._lock:
+            self.mock.swipes.append((swipe.group("action"), swipe.group("uuid")))
+        self._json({"status": 200, "match": False, "likes_remaining": 100})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="mock_tinder")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--api_port", type=int, default=8601)
+    args = parser.parse_args()
+
+    mock = MockTinder(args.port, args.api_port)
+    mock.start()
+    print(f"serving the page on :{args.port} and the API on :{args.api_port}")
+    print("start chrome with: " + " ".join(f"'{arg}'" for arg in mock.chrome_arguments))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.close()
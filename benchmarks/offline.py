@@ -0,0 +1,386 @@
+"""
+Measure swipe detection, profile parsing, storage and end-to-end swiping
+against the local Tinder stand-in from benchmarks/mock_tinder.py in headless
+Chrome, without an account or network access. End-to-end swiping is repeated
+with each resource blocking preset, for page load time, time and bytes per card.
+
+Results are saved as JSON named after the commit they were measured on,
+so runs can be compared across commits.
+
+run from the repository root: python -m benchmarks.offline [--swipes 50]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from loguru import logger
+
+from benchmarks.mock_tinder import MockTinder
+from events import catch_swipe_by_js_events, catch_swipe_by_network_request
+from interceptor import InterceptingSession
+from learned_matchmaker import download_main_image
+from matchmaker import RandomMatchmaker
+from readiness import install_dom_observer
+from resources import RESOURCE_PRESETS
+from storage import ProfileStore
+from tinder_auto import get_geomatch, launch_training, run_auto
+
+# keydowns dispatched from the page itself, so the timestamp
+# is taken where the user would press the key
+PRESS_KEY_SCRIPT = """
+const [key, delay] = arguments;
+window.__pressedAt = null;
+setTimeout(() => {
+  window.__pressedAt = Date.now();
+  document.dispatchEvent(new KeyboardEvent("keydown", { key }));
+}, delay);
+"""
+
+# a user swiping through `count` cards, one every `pace` milliseconds
+AUTO_SWIPE_SCRIPT = """
+const [count, pace] = arguments;
+let left = count;
+const timer = setInterval(() => {
+  const key = Math.random() < 0.5 ? "ArrowLeft" : "ArrowRight";
+  document.dispatchEvent(new KeyboardEvent("keydown", { key }));
+  if (--left <= 0) clearInterval(timer);
+}, pace);
+"""
+
+
+class OfflineSession(InterceptingSession):
+    """
+    Everything the swipe handling code uses from PersistentSession,
+    on a browser that isn't logged in through TinderBotz
+    """
+
+    def __init__(self, browser, intercept: str, resources: str = "none") -> None:
+        self.browser = browser
+        self.start_interception(intercept)
+        self.block_resources(resources)
+        install_dom_observer(browser)
+
+
+class KeyboardHelper:
+    """
+    Swipes the mock card with the keyboard, in place of GeomatchHelper
+    """
+
+    def __init__(self, browser) -> None:
+        self.browser = browser
+
+    def _press(self, key: str):
+        self.browser.execute_script(PRESS_KEY_SCRIPT, key, 0)
+
+    def like(self):
+        self._press("ArrowRight")
+
+    def dislike(self):
+        self._press("ArrowLeft")
+
+    def superlike(self):
+        self._press("Enter")
+
+
+def open_session(
+    mock: MockTinder, intercept: str, resources: str = "none", timeout: float = 30
+):
+    import undetected_chromedriver as uc
+
+    options = uc.ChromeOptions()
+    for argument in mock.chrome_arguments:
+        options.add_argument(argument)
+    browser = uc.Chrome(options=options, headless=True)
+
+    session = OfflineSession(browser, intercept, resources)
+    session.opened = time.perf_counter()
+    browser.get(mock.url)
+
+    deadline = time.monotonic() + timeout
+    while not len(session.recs):
+        if time.monotonic() > deadline:
+            browser.quit()
+            raise TimeoutError("mock page didn't load recommendations")
+        time.sleep(0.05)
+    session.load_seconds = time.perf_counter() - session.opened
+    return session
+
+
+def summarize(seconds: list[float]) -> dict:
+    if not seconds:
+        return {"n": 0}
+
+    ms = sorted(value * 1000 for value in seconds)
+    quantiles = statistics.quantiles(ms, n=100) if len(ms) > 1 else ms * 99
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(quantiles[49], 3),
+        "p90_ms": round(quantiles[89], 3),
+        "p99_ms": round(quantiles[98], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def drain(session):
+    while not session.swipe_events.empty():
+        session.swipe_events.get_nowait()
+
+
+def network_detection(session, swipes: int, timeout: float) -> dict:
+    """
+    Key press in the page to the swipe request caught in Python
+    """
+    latencies = []
+    for _ in range(swipes):
+        session.browser.execute_script(PRESS_KEY_SCRIPT, "ArrowRight", 0)
+        catch_swipe_by_network_request(session, timeout)
+        caught = time.time()
+        pressed = session.browser.execute_script("return window.__pressedAt")
+        latencies.append(caught - pressed / 1000)
+    return summarize(latencies)
+
+
+def js_detection(session, swipes: int, timeout: float) -> dict:
+    """
+    Key press in the page to the injected listener's element being found
+    """
+    latencies = []
+    for _ in range(swipes):
+        # the key is pressed once the listener is injected and polled for
+        session.browser.execute_script(PRESS_KEY_SCRIPT, "ArrowLeft", 200)
+        catch_swipe_by_js_events(session, timeout)
+        caught = time.time()
+        pressed = session.browser.execute_script("return window.__pressedAt")
+        latencies.append(caught - pressed / 1000)
+
+    # the page sent these swipes to the API as well
+    drain(session)
+    return summarize(latencies)
+
+
+def geomatch_parsing(session, repeat: int) -> dict:
+    """
+    get_geomatch on the card on screen, served from the recommendations cache.
+    The DOM fallback needs TinderBotz and a logged in Session
+    """
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        get_geomatch(session)
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies)
+
+
+def local_store(mock: MockTinder, folder: str, **kwargs) -> ProfileStore:
+    storage = ProfileStore(Path(folder), **kwargs)
+    mock.mount(storage.downloader.http)
+    return storage
+
+
+def storage_throughput(mock: MockTinder, profiles: int) -> dict:
+    """
+    Swipes recorded per second, and images stored per second
+    once the downloads queued by the swipes finish
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        storage = local_store(mock, folder, max_images=mock.photos)
+        try:
+            started = time.perf_counter()
+            for index in range(profiles):
+                user = mock.profile(10**6 + index)["user"]
+                storage.save_profile(
+                    user["_id"],
+                    "like",
+                    [photo["url"] for photo in user["photos"]],
+                    user["name"],
+                )
+            saved = time.perf_counter()
+            storage.downloader.flush()
+            flushed = time.perf_counter()
+            stats = storage.downloader.stats
+        finally:
+            storage.close()
+
+    return {
+        "profiles": profiles,
+        "saves_per_second": round(profiles / (saved - started), 1),
+        "images_per_second": round(stats.completed / (flushed - started), 1),
+        "images_failed": stats.failed,
+    }
+
+
+def image_loading(mock: MockTinder) -> dict:
+    """
+    Whether the learned matchmaker gets the photo of a profile scraped from
+    the page, whose urls are css values, as well as of one from the API
+    """
+    url = f"http://127.0.0.1:{mock.port}/images/{0:024x}-0.jpg"
+    return {
+        style: download_main_image(SimpleNamespace(image_urls=[image_url])) is not None
+        for style, image_url in (("api", url), ("dom", f'url("{url}")'))
+    }
+
+
+def auto_rate(mock: MockTinder, session, profiles: int, timeout: float) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        storage = local_store(mock, folder)
+        try:
+            started = time.perf_counter()
+            swiped = run_auto(
+                session,
+                storage,
+                n_profiles=profiles,
+                matchmaker=RandomMatchmaker(ratio=50),
+                swipe_timeout=timeout,
+                helper=KeyboardHelper(session.browser),
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            storage.close()
+
+    return {
+        "profiles": swiped,
+        "profiles_per_minute": round(swiped / (elapsed / 60), 1),
+    }
+
+
+def resource_usage(
+    mock: MockTinder, intercept: str, preset: str, profiles: int, timeout: float
+) -> dict:
+    """
+    Auto mode in a fresh browser with a resource blocking preset,
+    counting the bytes the mock served while swiping
+    """
+    session = open_session(mock, intercept, preset)
+    try:
+        with mock._lock:
+            mock.bytes_sent.clear()
+        rate = auto_rate(mock, session, profiles, timeout)
+        with mock._lock:
+            sent = dict(mock.bytes_sent)
+    finally:
+        session.browser.quit()
+
+    swiped = max(rate["profiles"], 1)
+    return {
+        "load_seconds": round(session.load_seconds, 3),
+        "seconds_per_card": round(60 / max(rate["profiles_per_minute"], 1e-6), 3),
+        "bytes_per_card": round(sum(sent.values()) / swiped),
+        "bytes_per_card_by_type": {
+            content_type: round(size / swiped) for content_type, size in sent.items()
+        },
+    }
+
+
+def training_rate(
+    mock: MockTinder, session, profiles: int, pace: float, idle_timeout: float
+) -> dict:
+    """
+    A simulated user swipes `profiles` cards, one every `pace` seconds;
+    training mode returns once no swipe came for `idle_timeout` seconds
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        storage = local_store(mock, folder)
+        try:
+            session.browser.execute_script(
+                AUTO_SWIPE_SCRIPT, profiles, int(pace * 1000)
+            )
+            started = time.perf_counter()
+            launch_training(storage, session, idle_timeout)
+            elapsed = time.perf_counter() - started - idle_timeout
+            recorded = len(storage.swipes)
+        finally:
+            storage.close()
+
+    return {
+        "swiped": profiles,
+        "recorded": recorded,
+        "pace_seconds": pace,
+        "profiles_per_minute": round(recorded / (elapsed / 60), 1),
+    }
+
+
+def commit() -> str:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return result.stdout.strip() or "unknown"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="offline")
+    parser.add_argument("--swipes", type=int, default=50)
+    parser.add_argument("--profiles", type=int, default=200)
+    parser.add_argument("--intercept", choices=["fetch", "network"], default="fetch")
+    parser.add_argument(
+        "--resources",
+        nargs="+",
+        choices=list(RESOURCE_PRESETS),
+        default=list(RESOURCE_PRESETS),
+        help="resource blocking presets to compare",
+    )
+    parser.add_argument("--pace", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument(
+        "--api_latency",
+        type=float,
+        default=0.0,
+        help="seconds the mock API takes to answer a swipe",
+    )
+    parser.add_argument("--output", type=Path, default=Path("benchmarks/results"))
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    mock = MockTinder(args.port, args.port + 1, latency=args.api_latency)
+    mock.start()
+
+    results = {
+        "commit": commit(),
+        "timestamp": time.time(),
+        "config": {key: str(value) for key, value in vars(args).items()},
+    }
+    try:
+        results["profile_store"] = storage_throughput(mock, args.profiles)
+        results["image_loading"] = image_loading(mock)
+
+        session = open_session(mock, args.intercept)
+        try:
+            results["get_geomatch"] = geomatch_parsing(session, args.swipes)
+            results["catch_swipe_by_network_request"] = network_detection(
+                session, args.swipes, args.timeout
+            )
+            results["catch_swipe_by_js_events"] = js_detection(
+                session, args.swipes, args.timeout
+            )
+            results["run_auto"] = auto_rate(mock, session, args.swipes, args.timeout)
+            results["launch_training"] = training_rate(
+                mock, session, args.swipes, args.pace, idle_timeout=3
+            )
+        finally:
+            session.browser.quit()
+
+        results["resources"] = {
+            preset: resource_usage(
+                mock, args.intercept, preset, args.swipes, args.timeout
+            )
+            for preset in args.resources
+        }
+    finally:
+        mock.close()
+
+    print(json.dumps(results, indent=2))
+    args.output.mkdir(parents=True, exist_ok=True)
+    (args.output / f"offline-{results['commit']}.json").write_text(
+        json.dumps(results, indent=2)
+    )
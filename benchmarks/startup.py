@@ -0,0 +1,138 @@
+"""
+Measure how long the CLI and web entry points take to import, and with --live
+how long it takes from process start to the first parsed profile.
+Results are printed and saved as JSON so regressions can be tracked.
+
+run from the repository root: python -m benchmarks.startup [--live]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ENTRY_POINTS = {"cli": "tinder_auto", "web": "web_service"}
+
+# dependencies which should only load once a browser session is started
+HEAVY_MODULES = [
+    "selenium",
+    "undetected_chromedriver",
+    "tinderbotz",
+    "PIL",
+    "requests",
+    "numpy",
+]
+
+FIRST_PROFILE_SCRIPT = """
+from pathlib import Path
+from tinder_auto import get_geomatch, init
+
+storage, session = init(out=Path("output"))
+get_geomatch(session)
+storage.close()
+session.browser.quit()
+"""
+
+
+def python(*args: str, **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, check=True, **kwargs
+    )
+
+
+def import_time(module: str, repeat: int) -> dict:
+    """
+    Wall time of a fresh interpreter importing the module,
+    minus the time of a bare interpreter start
+    """
+
+    def best(code: str) -> float:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            python("-c", code)
+            times.append(time.perf_counter() - started)
+        return min(times)
+
+    baseline = best("pass")
+    total = best(f"import {module}")
+
+    # self-reported cumulative import time of the module from -X importtime
+    report = python("-X", "importtime", "-c", f"import {module}").stderr
+    cumulative = next(
+        int(line.split("|")[1])
+        for line in reversed(report.splitlines())
+        if line.split("|")[-1].strip() == module
+    )
+
+    loaded = python(
+        "-c",
+        f"import sys, {module}; print(' '.join(sys.modules))",
+    ).stdout.split()
+
+    return {
+        "import_seconds": round(total - baseline, 4),
+        "importtime_cumulative_seconds": cumulative / 1e6,
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in loaded],
+    }
+
+
+def cli_first_profile() -> float:
+    started = time.perf_counter()
+    python("-c", FIRST_PROFILE_SCRIPT)
+    return time.perf_counter() - started
+
+
+def web_first_profile(port: int, timeout: float) -> float:
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "web_service:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/", timeout=timeout
+                ):
+                    return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.1)
+        raise TimeoutError("web service didn't serve a profile in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="startup")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--live", action="store_true", help="also measure time to the first profile"
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument(
+        "--output", type=Path, default=Path("benchmarks/results/startup.json")
+    )
+    args = parser.parse_args()
+
+    results = {
+        name: import_time(module, args.repeat) for name, module in ENTRY_POINTS.items()
+    }
+    if args.live:
+        results["cli"]["first_profile_seconds"] = round(cli_first_profile(), 3)
+        results["web"]["first_profile_seconds"] = round(
+            web_first_profile(args.port, args.timeout), 3
+        )
+
+    print(json.dumps(results, indent=2))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+
+    raise SystemExit(any(result["heavy_modules_loaded"] for result in results.values()))
@@ -0,0 +1,70 @@
+"""
+Fire overlapping requests at a running web_service and report how they were handled.
+Every request should either succeed, join an identical one in flight, or be
+rejected with 409; a 5xx means the browser was left in a bad state.
+
+start the service first (uvicorn web_service:app), then
+run from the repository root: python -m benchmarks.web_load
+"""
+
+import argparse
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+REQUESTS = [
+    ("GET", "/"),
+    ("POST", "/swipe/like"),
+    ("POST", "/swipe/dislike"),
+]
+
+
+def send(base_url: str, method: str, path: str, timeout: float) -> tuple[int, float]:
+    request = urllib.request.Request(base_url + path, method=method)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status = response.status
+            response.read()
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="web_load")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=90)
+    args = parser.parse_args()
+
+    statuses = Counter()
+    latencies = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for _ in range(args.rounds):
+            burst = [random.choice(REQUESTS) for _ in range(args.concurrency)]
+            for status, latency in pool.map(
+                lambda request: send(args.url, *request, args.timeout), burst
+            ):
+                statuses[status] += 1
+                latencies.append(latency)
+
+    print(f"statuses: {dict(statuses)}")
+    print(
+        f"latency p50: {percentile(latencies, 50):.3f}s, "
+        f"p99: {percentile(latencies, 99):.3f}s"
+    )
+
+    failed = sum(count for status, count in statuses.items() if not 200 <= status < 500)
+    raise SystemExit(failed > 0)
@@ -0,0 +1,90 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, Optional
+
+from loguru import logger
+
+
+class BrowserBusy(Exception):
+    pass
+
+
+class BrowserWorker:
+    """
+    Run every browser command on one dedicated thread, one at a time.
+
+    A command submitted while an identical one (same key) is still queued
+    or running shares its result instead of running twice, a command
+    conflicting with a pending one is rejected with BrowserBusy
+    """
+
+    def __init__(self) -> None:
+        self._commands: queue.Queue = queue.Queue()
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self._thread = threading.Thread(
+            target=self._work, name="browser-worker", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        key: str,
+        command: Callable[..., Any],
+        *args,
+        conflicts: Iterable[str] = (),
+    ) -> Future:
+        with self._lock:
+            if (future := self._pending.get(key)) is not None:
+                logger.debug(f"coalescing browser command {key}")
+                return future
+
+            if busy := [other for other in conflicts if other in self._pending]:
+                raise BrowserBusy(f"{key} conflicts with pending {', '.join(busy)}")
+
+            future = Future()
+            self._pending[key] = future
+            self._commands.put((key, future, command, args))
+
+        return future
+
+    async def run(
+        self,
+        key: str,
+        command: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        conflicts: Iterable[str] = (),
+    ):
+        """
+        Submit a command and await its result without blocking the event loop.
+        The command keeps running if waiting for it times out
+        """
+        future = self.submit(key, command, *args, conflicts=conflicts)
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)), timeout
+        )
+
+    def _work(self):
+        while (item := self._commands.get()) is not None:
+            key, future, command, args = item
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(command(*args))
+                except Exception as e:
+                    logger.error(f"browser command {key} failed: {e}")
+                    future.set_exception(e)
+
+            with self._lock:
+                del self._pending[key]
+
+    def close(self):
+        """
+        Finish queued commands and stop the worker
+        """
+        self._commands.put(None)
+        self._thread.join()
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Callable, Optional
+
+from loguru import logger
+
+from common import SwipeEvent
+
+if TYPE_CHECKING:
+    from tinderbotz.helpers.geomatch import Geomatch
+
+
+def card_key(profile: "Geomatch") -> Optional[tuple[str, ...]]:
+    """
+    Tell scraped cards apart by their photos: flipping through a card keeps
+    its photos and different people can share a name. None if there are none
+    """
+    return tuple(sorted(profile.image_urls)) or None
+
+
+class SwipeCapture:
+    """
+    Join the stream of swipe events with the stream of parsed profiles.
+
+    Events are handled strictly in the order they were caught. An event is
+    paired with the profile parsed under the same uuid. Profiles parsed
+    without a uuid (e.g. scraped from the DOM) carry the time their card
+    was shown, and an event is paired with the last one shown before the
+    swipe; older ones left unswiped are dropped. An event with no profile
+    after `grace` seconds is passed on unmatched.
+    """
+
+    def __init__(
+        self,
+        on_swipe: Callable[[SwipeEvent, Optional["Geomatch"]], None],
+        *,
+        grace: float = 5,
+        max_profiles: int = 1000,
+    ) -> None:
+        self.on_swipe = on_swipe
+        self.grace = grace
+        self.max_profiles = max_profiles
+
+        self.recorded = 0
+        self.unmatched = 0
+        self.stale = 0
+
+        self._cond = threading.Condition()
+        self._events: deque[tuple[float, SwipeEvent]] = deque()
+        self._profiles: OrderedDict[str, "Geomatch"] = OrderedDict()
+        self._anonymous: deque[tuple[float, "Geomatch"]] = deque()
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="swipe-capture", daemon=True
+        )
+        self._thread.start()
+
+    def add_profile(
+        self,
+        profile: "Geomatch",
+        uuid: Optional[str] = None,
+        shown: Optional[float] = None,
+    ):
+        """
+        `shown` is the time.monotonic() from which the card was on screen,
+        profiles without a uuid are expected in the order they were shown
+        """
+        with self._cond:
+            if uuid is None:
+                shown = time.monotonic() if shown is None else shown
+                self._anonymous.append((shown, profile))
+                while len(self._anonymous) > self.max_profiles:
+                    self._anonymous.popleft()
+                    self.stale += 1
+            else:
+                self._profiles[uuid] = profile
+                self._profiles.move_to_end(uuid)
+                # profiles that were never swiped shouldn't pile up
+                while len(self._profiles) > self.max_profiles:
+                    self._profiles.popitem(last=False)
+
+            self._cond.notify()
+
+    def add_event(self, event: SwipeEvent, caught: Optional[float] = None):
+        with self._cond:
+            caught = time.monotonic() if caught is None else caught
+            self._events.append((caught, event))
+            self._cond.notify()
+
+    def _shown_before(self, caught: float) -> Optional["Geomatch"]:
+        # the card on screen at the time of the swipe is the last one shown
+        # before it, the ones shown earlier were swiped without being paired
+        profile = None
+        while self._anonymous and self._anonymous[0][0] <= caught:
+            if profile is not None:
+                logger.debug(f"dropping stale profile {profile.name}")
+                self.stale += 1
+            _, profile = self._anonymous.popleft()
+        return profile
+
+    def _take(self) -> Optional[tuple[SwipeEvent, Optional["Geomatch"]]]:
+        if not self._events:
+            return None
+
+        caught, event = self._events[0]
+        if (profile := self._profiles.pop(event.profile_uuid, None)) is None:
+            # once a card shown after the swipe was parsed,
+            # no profile the swipe could belong to is still on its way
+            settled = bool(self._anonymous) and self._anonymous[-1][0] > caught
+            if not (settled or self._closed or time.monotonic() - caught >= self.grace):
+                return None
+            profile = self._shown_before(caught)
+
+        self._events.popleft()
+        return event, profile
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while (swipe := self._take()) is None:
+                    if self._closed and not self._events:
+                        return
+                    self._cond.wait(self.grace if self._events else None)
+
+            event, profile = swipe
+            if profile is None:
+                logger.warning(f"no profile was captured for {event}")
+                self.unmatched += 1
+
+            try:
+                self.on_swipe(event, profile)
+            except Exception as e:
+                logger.error(f"failed to record {event}: {e}")
+                continue
+
+            self.recorded += 1
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._events)
+
+    def close(self):
+        """
+        Pass on the remaining events and stop the capture thread
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+        logger.debug(
+            f"swipe capture closed: {self.recorded} recorded, "
+            f"{self.unmatched} unmatched, {self.stale} stale profiles dropped"
+        )
@@ -11,3 +11,6 @@ class SwipeEvent:
     def __init__(self, profile_uuid: str, action: SwipeAction):
         self.profile_uuid = profile_uuid
         self.action = action
+
+    def __repr__(self) -> str:
+        return f"SwipeEvent(profile_uuid={self.profile_uuid!r}, action={self.action.value!r})"
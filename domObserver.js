@@ -0,0 +1,20 @@
+// Count DOM mutations so Python can wait for the page to change and settle
+// instead of sleeping for a fixed amount of time
+(() => {
+    if (window.__tinderAuto) {
+        return;
+    }
+
+    const state = {
+        version: 0,
+        lastMutation: performance.now(),
+        waiters: new Set(),
+    };
+    window.__tinderAuto = state;
+
+    new MutationObserver(() => {
+        state.version += 1;
+        state.lastMutation = performance.now();
+        state.waiters.forEach((notify) => notify());
+    }).observe(document, { childList: true, subtree: true, attributes: true });
+})();
@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+
+from metrics import IMAGE_DOWNLOADS
+from timer import catchtime
+
+
+class DownloadStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _add(self, **deltas: int):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def __repr__(self) -> str:
+        return (
+            f"DownloadStats(pending={self.pending}, "
+            f"completed={self.completed}, failed={self.failed})"
+        )
+
+
+class ImageDownloader:
+    """
+    Download images in a pool of background workers
+    sharing a single keep-alive HTTP session.
+
+    Jobs are put on a bounded queue, so a slow CDN can stall
+    the caller only once `max_pending` downloads are queued.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 256,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 15,
+    ) -> None:
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.stats = DownloadStats()
+
+        # requests is only loaded once the store is set up
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self._jobs: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._workers = [
+            threading.Thread(
+                target=self._work, name=f"image-downloader-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, url: str, on_done: Callable[[bytes], None]):
+        """
+        Queue an image download, `on_done` is called
+        with the response body from a worker thread
+        """
+        self.stats._add(pending=1)
+        self._jobs.put((url, on_done))
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """
+        Download an image right away with the shared session and retries,
+        None if it couldn't be had
+        """
+        import requests
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                r = self.http.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.warning(f"error getting an image from url: {url} ({e})")
+                continue
+
+            if 200 <= r.status_code <= 299:
+                return r.content
+
+            logger.warning(f"got error code {r.status_code} for url: {url}")
+            # client errors won't go away on retry
+            if 400 <= r.status_code <= 499 and r.status_code != 429:
+                break
+
+        return None
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._jobs.task_done()
+                return
+
+            url, on_done = job
+            try:
+                with catchtime("image download", stage="image_download"):
+                    content = self.fetch(url)
+                if content is None:
+                    logger.error(f"giving up on image download: {url}")
+                    self.stats._add(pending=-1, failed=1)
+                    IMAGE_DOWNLOADS.inc(result="failed")
+                    continue
+
+                on_done(content)
+                self.stats._add(pending=-1, completed=1)
+                IMAGE_DOWNLOADS.inc(result="completed")
+            except Exception as e:
+                logger.error(f"failed to store image from url: {url}")
+                logger.error(e)
+                self.stats._add(pending=-1, failed=1)
+                IMAGE_DOWNLOADS.inc(result="failed")
+            finally:
+                self._jobs.task_done()
+
+    def flush(self):
+        """
+        Block until every queued download is finished
+        """
+        self._jobs.join()
+
+    def close(self):
+        """
+        Drain the queue and stop the workers
+        """
+        self.flush()
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        self.http.close()
+
+        logger.debug(f"image downloader closed: {self.stats}")
@@ -1,15 +1,17 @@
+import queue
 from pathlib import Path
-from pprint import pformat
 
 from loguru import logger
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
 
 from common import SwipeAction, SwipeEvent
+from timer import catchtime
 
 
 def catch_swipe_by_js_events(session, timeout) -> SwipeAction:
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.wait import WebDriverWait
+
     event_catch_script = Path("swipeEventListener.js").read_text()
     session.browser.execute_script(event_catch_script)
 
@@ -48,30 +50,16 @@ def catch_swipe_by_js_events(session, timeout) -> SwipeAction:
     return SwipeAction(swipe_event)
 
 
-class swipe_request_caught(object):
-    def __init__(self):
-        pass
-
-    def __call__(self, driver):
-        if driver.swipe_event is not None:
-            driver.listening = False
-            return driver.swipe_event
-        else:
-            return False
-
-
 def catch_swipe_by_network_request(session, timeout) -> SwipeEvent:
     logger.info("You can swipe now!")
     logger.info("will be listening to network events")
 
-    session.browser.listening = True
-
-    swipe_event = WebDriverWait(
-        session.browser, timeout=timeout, poll_frequency=0.1
-    ).until(swipe_request_caught())
-
-    session.browser.swipe_event = None
+    with catchtime("catching swipe request", stage="catch_swipe_by_network_request"):
+        try:
+            swipe_event = session.swipe_events.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no swipe caught in {timeout} seconds")
 
-    logger.info(f"got swipe event from network: {pformat(swipe_event)}")
+    logger.info(f"got swipe event from network: {swipe_event}")
 
-    return SwipeEvent(**swipe_event)
+    return swipe_event
@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+from loguru import logger
+
+from features import FEATURE_SIZE, image_features
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS features (
+    uuid TEXT PRIMARY KEY,
+    row INTEGER NOT NULL,
+    hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS features_hash ON features (hash);
+"""
+
+
+class FeatureCache:
+    """
+    Image features of stored profiles in a flat float32 file, one fixed
+    width row per profile, memory-mapped for reading. A sqlite index maps
+    profile uuids to rows along with the hash of the image each row was
+    computed from.
+
+    Rows are only ever appended: when the image of a profile changes
+    its features go to a new row and the old one is left unused
+    until the cache is compacted
+    """
+
+    def __init__(self, folder: Path, width: int = FEATURE_SIZE) -> None:
+        self.width = width
+        self.data_path = folder / "features.f32"
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(folder / "features.db", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+        # the feature definition changed, cached rows are of no use
+        (version,) = self._db.execute("PRAGMA user_version").fetchone()
+        if version != width:
+            if version:
+                logger.info(f"feature width changed from {version}, resetting cache")
+            self._db.execute("DELETE FROM features")
+            self._db.execute(f"PRAGMA user_version = {width}")
+            self.data_path.unlink(missing_ok=True)
+        self._db.commit()
+
+        self.data_path.touch()
+        # a row cut short by a crash is dropped, its index entry was never written
+        self._rows = self.data_path.stat().st_size // self._row_bytes
+        with open(self.data_path, "r+b") as f:
+            f.truncate(self._rows * self._row_bytes)
+
+        self._map: Optional[np.ndarray] = None
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.width * np.dtype(np.float32).itemsize
+
+    def hash(self, uuid: str) -> Optional[str]:
+        """
+        Get the hash of the image the cached features of a profile come from
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT hash FROM features WHERE uuid = ?", (uuid,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, uuid: str, hash: str, features: np.ndarray) -> int:
+        """
+        Cache features of a profile computed from the image with `hash`
+        """
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if features.shape != (self.width,):
+            raise ValueError(f"expected {self.width} features, got {features.shape}")
+
+        with self._lock:
+            row = self._append(features)
+            self._db.execute(
+                "INSERT OR REPLACE INTO features (uuid, row, hash) VALUES (?, ?, ?)",
+                (uuid, row, hash),
+            )
+            self._db.commit()
+        return row
+
+    def _append(self, features: np.ndarray) -> int:
+        with open(self.data_path, "ab") as f:
+            f.write(features.tobytes())
+        self._rows += 1
+        return self._rows - 1
+
+    def update(self, uuid: str, hash: str, image: Path | bytes) -> bool:
+        """
+        Compute and cache features for a profile unless they are up to date.
+        Profiles sharing an image share a row
+        """
+        with self._lock:
+            rows = dict(
+                self._db.execute(
+                    "SELECT uuid, row FROM features WHERE hash = ?", (hash,)
+                ).fetchall()
+            )
+            if uuid in rows:
+                return False
+
+            if rows:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO features (uuid, row, hash) VALUES (?, ?, ?)",
+                    (uuid, next(iter(rows.values())), hash),
+                )
+                self._db.commit()
+                return True
+
+        self.put(uuid, hash, image_features(image))
+        return True
+
+    def matrix(self) -> np.ndarray:
+        """
+        Map every cached row into memory without reading the file
+        """
+        with self._lock:
+            if self._map is None or len(self._map) != self._rows:
+                if not self._rows:
+                    return np.empty((0, self.width), dtype=np.float32)
+                self._map = np.memmap(
+                    self.data_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(self._rows, self.width),
+                )
+            return self._map
+
+    def rows(self, uuids: Iterable[str]) -> dict[str, int]:
+        """
+        Get matrix rows of the profiles which have features cached
+        """
+        uuids = list(uuids)
+        found = {}
+        with self._lock:
+            # sqlite limits the number of query parameters
+            for start in range(0, len(uuids), 500):
+                chunk = uuids[start : start + 500]
+                found.update(
+                    self._db.execute(
+                        "SELECT uuid, row FROM features WHERE uuid IN "
+                        f"({', '.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        return found
+
+    def __contains__(self, uuid: str) -> bool:
+        return self.hash(uuid) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM features").fetchone()
+        return count
+
+    @property
+    def stale_rows(self) -> int:
+        """
+        Rows no profile points at any more
+        """
+        with self._lock:
+            (used,) = self._db.execute(
+                "SELECT COUNT(DISTINCT row) FROM features"
+            ).fetchone()
+        return self._rows - used
+
+    def compact(self):
+        """
+        Rewrite the feature file without the unused rows
+        """
+        matrix = self.matrix()
+        with self._lock:
+            entries = self._db.execute("SELECT uuid, row FROM features").fetchall()
+            used = sorted({row for _, row in entries})
+            moved = {old: new for new, old in enumerate(used)}
+
+            compacted = self.data_path.with_suffix(".f32.tmp")
+            with open(compacted, "wb") as f:
+                for old in used:
+                    f.write(matrix[old].tobytes())
+
+            self._map = None
+            compacted.replace(self.data_path)
+            self._db.executemany(
+                "UPDATE features SET row = ? WHERE uuid = ?",
+                [(moved[row], uuid) for uuid, row in entries],
+            )
+            self._db.commit()
+
+            logger.info(
+                f"compacted feature cache from {self._rows} to {len(used)} rows"
+            )
+            self._rows = len(used)
+
+    def close(self):
+        with self._lock:
+            self._map = None
+            self._db.close()
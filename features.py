@@ -0,0 +1,50 @@
+import io
+from pathlib import Path
+
+import numpy as np
+
+
+# downsampled grayscale thumbnail side, in pixels
+THUMBNAIL_SIZE = 16
+# bins per RGB channel in the colour histogram
+HISTOGRAM_BINS = 8
+
+FEATURE_SIZE = THUMBNAIL_SIZE * THUMBNAIL_SIZE + 3 * HISTOGRAM_BINS
+
+
+def image_features(image: Path | bytes) -> np.ndarray:
+    """
+    Compute a fixed size feature vector for an image: a downsampled
+    grayscale thumbnail followed by a normalised RGB colour histogram
+    """
+    from PIL import Image
+
+    source = io.BytesIO(image) if isinstance(image, bytes) else image
+    with Image.open(source) as img:
+        img = img.convert("RGB")
+        # histograms don't need full resolution
+        img.thumbnail((128, 128))
+
+        thumbnail = np.asarray(
+            img.convert("L").resize(
+                (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.BILINEAR
+            ),
+            dtype=np.float32,
+        ).ravel()
+        pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+
+    histogram = (
+        np.stack(
+            [
+                np.bincount(
+                    pixels[:, channel] // (256 // HISTOGRAM_BINS),
+                    minlength=HISTOGRAM_BINS,
+                )
+                for channel in range(3)
+            ]
+        )
+        .ravel()
+        .astype(np.float32)
+    )
+
+    return np.concatenate([thumbnail / 255, histogram / len(pixels)])
@@ -0,0 +1,70 @@
+import random
+import threading
+import time
+from typing import Optional
+
+
+class RateGovernor:
+    """
+    Token bucket letting through at most `rate` actions per minute on average,
+    with up to `burst` actions in a row after an idle period.
+
+    Every wait is shifted by a random amount of up to `jitter` times the
+    average interval either way, so actions don't come at a fixed cadence.
+    An action let through early is paid back by the next wait
+    """
+
+    def __init__(self, rate: float, burst: int = 1, jitter: float = 0.0) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+
+        self.interval = 60 / rate
+        self.burst = burst
+        self.jitter = jitter
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) / self.interval
+        )
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """
+        Seconds until the next action is let through
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(1 - self._tokens, 0) * self.interval
+        shift = random.uniform(-self.jitter, self.jitter) * self.interval
+        return max(wait + shift, 0)
+
+    def acquire(
+        self,
+        deadline: Optional[float] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> bool:
+        """
+        Wait for a token. Returns False without waiting if the token would only
+        come after the `deadline` (a time.monotonic() value), or as soon as
+        `stop` is set
+        """
+        wait = self.wait_time()
+        if deadline is not None and time.monotonic() + wait > deadline:
+            return False
+
+        if stop is not None:
+            if stop.wait(wait):
+                return False
+        else:
+            time.sleep(wait)
+
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+        return True
@@ -0,0 +1,214 @@
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from image_store import ImageStore
+
+# side of the square images the matchmaker is trained on
+NORMALIZED_SIZE = 256
+# longest side of the thumbnails served to the web UI
+PREVIEW_SIZE = 320
+
+
+class Variant(NamedTuple):
+    folder: str
+    ext: str
+
+
+NORMALIZED = Variant("normalized", "jpeg")
+THUMBNAIL = Variant("thumbs", "webp")
+
+
+def variant_path(folder: Path, hash: str, variant: Variant) -> Path:
+    return folder / variant.folder / hash[:2] / f"{hash}.{variant.ext}"
+
+
+class ProcessedImage(NamedTuple):
+    hash: str
+    source_bytes: int
+    output_bytes: int
+    error: Optional[str] = None
+
+
+def process_image(source: Path, hash: str, folder: Path) -> ProcessedImage:
+    """
+    Verify and decode a stored image, then write the normalized training
+    image and the thumbnail. Neither keeps the metadata of the original
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(source) as img:
+            img.verify()
+
+        # a verified image can't be decoded, it has to be opened again
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img).convert("RGB")
+        img.info = {}
+
+        normalized = variant_path(folder, hash, NORMALIZED)
+        normalized.parent.mkdir(parents=True, exist_ok=True)
+        ImageOps.fit(
+            img, (NORMALIZED_SIZE, NORMALIZED_SIZE), Image.Resampling.LANCZOS
+        ).save(normalized, "JPEG", quality=90, optimize=True)
+
+        thumbnail = variant_path(folder, hash, THUMBNAIL)
+        thumbnail.parent.mkdir(parents=True, exist_ok=True)
+        img.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.LANCZOS)
+        img.save(thumbnail, "WEBP", quality=80)
+    except Exception as e:
+        return ProcessedImage(hash, 0, 0, f"{type(e).__name__}: {e}")
+
+    return ProcessedImage(
+        hash,
+        source.stat().st_size,
+        normalized.stat().st_size + thumbnail.stat().st_size,
+    )
+
+
+class ImagePipeline:
+    """
+    Produce normalized and thumbnail versions of stored images in a pool of
+    worker processes, decoding never competes with the browser for the GIL.
+
+    Worker processes are started on first use
+    """
+
+    def __init__(self, store: ImageStore, workers: Optional[int] = None) -> None:
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=mp.get_context("spawn")
+                )
+            return self._executor
+
+    def path(self, hash: str, variant: Variant) -> Path:
+        return variant_path(self.store.folder, hash, variant)
+
+    def is_processed(self, hash: str) -> bool:
+        return all(self.path(hash, v).exists() for v in (NORMALIZED, THUMBNAIL))
+
+    def submit(self, hash: str) -> Optional[Future]:
+        """
+        Queue a stored image for processing unless it is processed already
+        """
+        if self.is_processed(hash) or not (ext := self.store.ext(hash)):
+            return None
+
+        future = self._pool().submit(
+            process_image, self.store.path(hash, ext), hash, self.store.folder
+        )
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if error := future.exception():
+            logger.error(f"image processing worker failed: {error}")
+        elif (result := future.result()).error:
+            logger.error(f"failed to process image {result.hash}: {result.error}")
+
+    def backfill(self, force: bool = False, chunksize: int = 16) -> dict:
+        """
+        Process every stored image that is missing its normalized
+        versions, or all of them with `force`
+        """
+        images = [
+            (hash, ext)
+            for hash, ext in self.store.all()
+            if force or not self.is_processed(hash)
+        ]
+        logger.info(f"processing {len(images)} images in {self.workers} processes")
+
+        stats = {"processed": 0, "failed": 0, "source_bytes": 0, "output_bytes": 0}
+        started = time.perf_counter()
+        results = self._pool().map(
+            process_image,
+            [self.store.path(hash, ext) for hash, ext in images],
+            [hash for hash, _ in images],
+            [self.store.folder] * len(images),
+            chunksize=chunksize,
+        )
+        for done, result in enumerate(results, 1):
+            if result.error:
+                logger.error(f"failed to process image {result.hash}: {result.error}")
+                stats["failed"] += 1
+            else:
+                stats["processed"] += 1
+                stats["source_bytes"] += result.source_bytes
+                stats["output_bytes"] += result.output_bytes
+
+            if done % 500 == 0:
+                logger.info(f"processed {done}/{len(images)} images")
+
+        stats["seconds"] = time.perf_counter() - started
+        stats["images_per_second"] = len(images) / max(stats["seconds"], 1e-6)
+        logger.info(
+            f"processed {stats['processed']} images ({stats['failed']} failed) in "
+            f"{stats['seconds']:.1f}s, {stats['images_per_second']:.1f} images/second, "
+            f"{stats['source_bytes'] / 2**20:.1f}MB in, "
+            f"{stats['output_bytes'] / 2**20:.1f}MB out"
+        )
+        return stats
+
+    def close(self):
+        """
+        Wait for queued images and stop the worker processes
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="image_pipeline",
+        description="Normalize and thumbnail every image stored in an output folder",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default="output",
+        help="folder with swipe data",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes, all cores by default",
+        metavar="N",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="process images again even if they were processed before",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    store = ImageStore(args.out / "images")
+    pipeline = ImagePipeline(store, workers=args.workers)
+    try:
+        pipeline.backfill(force=args.force)
+    finally:
+        pipeline.close()
+        store.close()
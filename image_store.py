@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+# Pillow and numpy are only loaded once an image is stored
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    hash TEXT PRIMARY KEY,
+    phash INTEGER NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    similar_to TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profile_images (
+    uuid TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (uuid, position)
+);
+CREATE INDEX IF NOT EXISTS profile_images_hash ON profile_images (hash);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+"""
+
+
+def url_key(url: str) -> str:
+    """
+    Image URLs carry signed query parameters which change
+    between requests, only the path identifies the photo
+    """
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}"
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """
+    Difference hash: compare brightness of neighbouring pixels
+    in a downscaled grayscale image, near-duplicate images have
+    hashes with a small hamming distance
+    """
+    from PIL import Image
+
+    pixels = list(
+        image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS).getdata()
+    )
+
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = value << 1 | (left > right)
+    return value
+
+
+def bit_counts(values: np.ndarray) -> np.ndarray:
+    """
+    Number of set bits in every value of a uint64 array,
+    summed pairwise, then by nibble, then by byte
+    """
+    import numpy as np
+
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + (
+        (values >> np.uint64(2)) & np.uint64(0x3333333333333333)
+    )
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _to_signed(value: int) -> int:
+    # sqlite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class ImageStore:
+    """
+    Content-addressed image folder: every image is stored once
+    under its sha256 digest, with an index of which profiles use it
+    """
+
+    def __init__(self, folder: Path, similarity_threshold: int = 6) -> None:
+        self.folder = folder
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(folder / "index.db", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+        # perceptual hashes of stored images, in the same order as their digests
+        self._hashes: list[str] = []
+        self._phashes = array("Q")
+        for hash, phash in self._db.execute("SELECT hash, phash FROM images"):
+            self._hashes.append(hash)
+            self._phashes.append(_to_unsigned(phash))
+        self._stored = set(self._hashes)
+
+    def path(self, hash: str, ext: str = "jpeg") -> Path:
+        return self.folder / hash[:2] / f"{hash}.{ext}"
+
+    def ext(self, hash: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT ext FROM images WHERE hash = ?", (hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def all(self) -> list[tuple[str, str]]:
+        """
+        Get hash and extension of every stored image
+        """
+        with self._lock:
+            return self._db.execute("SELECT hash, ext FROM images").fetchall()
+
+    def known_url(self, url: str) -> Optional[str]:
+        """
+        Get the hash of an image that was already downloaded from this url
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT hash FROM urls WHERE url = ?", (url_key(url),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_similar(self, phash: int) -> Optional[str]:
+        """
+        Find a stored image perceptually close to the given hash
+        """
+        import numpy as np
+
+        with self._lock:
+            if not self._hashes:
+                return None
+            # the view has to be released before the array can grow again
+            phashes = np.frombuffer(self._phashes, dtype=np.uint64)
+            distances = bit_counts(phashes ^ np.uint64(phash))
+            del phashes
+
+            best = int(distances.argmin())
+            if distances[best] > self.similarity_threshold:
+                return None
+            return self._hashes[best]
+
+    def link(self, uuid: str, position: int, hash: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO profile_images (uuid, position, hash) VALUES (?, ?, ?)",
+                (uuid, position, hash),
+            )
+            self._db.commit()
+
+    def put(self, uuid: str, position: int, content: bytes, url: Optional[str] = None):
+        """
+        Store image content for a profile, the file is only
+        written if the same content isn't stored yet
+        """
+        hash = hashlib.sha256(content).hexdigest()
+
+        if hash in self._stored:
+            logger.debug(f"image {hash} is already stored, skipping write")
+        else:
+            from PIL import Image
+
+            image = Image.open(io.BytesIO(content))
+            ext = (image.format or "jpeg").lower()
+            phash = dhash(image)
+
+            if similar_to := self.find_similar(phash):
+                logger.debug(f"image {hash} is a near-duplicate of {similar_to}")
+
+            path = self.path(hash, ext)
+            path.parent.mkdir(exist_ok=True)
+            logger.debug(f"saving image to {path}")
+            path.write_bytes(content)
+
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO images (hash, phash, ext, size, similar_to, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        hash,
+                        _to_signed(phash),
+                        ext,
+                        len(content),
+                        similar_to,
+                        time.time(),
+                    ),
+                )
+                if hash not in self._stored:
+                    self._hashes.append(hash)
+                    self._phashes.append(phash)
+                    self._stored.add(hash)
+
+        with self._lock:
+            if url:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)",
+                    (url_key(url), hash),
+                )
+            self._db.execute(
+                "INSERT OR REPLACE INTO profile_images (uuid, position, hash) VALUES (?, ?, ?)",
+                (uuid, position, hash),
+            )
+            self._db.commit()
+
+        return hash
+
+    def hashes(self, uuid: str) -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT hash FROM profile_images WHERE uuid = ? ORDER BY position",
+                (uuid,),
+            ).fetchall()
+        return [hash for (hash,) in rows]
+
+    def paths(self, uuid: str) -> list[Path]:
+        """
+        Get paths of the images stored for a profile, main image first
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT images.hash, images.ext FROM profile_images "
+                "JOIN images ON images.hash = profile_images.hash "
+                "WHERE uuid = ? ORDER BY position",
+                (uuid,),
+            ).fetchall()
+        return [self.path(hash, ext) for hash, ext in rows]
+
+    def import_legacy(self):
+        """
+        Move images stored as `{uuid}.jpg` into the content-addressed layout
+        """
+        for legacy in self.folder.glob("*.jpg"):
+            try:
+                self.put(legacy.stem, 0, legacy.read_bytes())
+            except Exception as e:
+                logger.error(f"failed to import legacy image {legacy}: {e}")
+                continue
+            legacy.unlink()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
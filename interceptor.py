@@ -0,0 +1,278 @@
+import base64
+import queue
+import re
+import threading
+from typing import TYPE_CHECKING, Callable, Literal, Optional
+
+from loguru import logger
+
+from common import SwipeAction, SwipeEvent
+from recs import RECS_RESPONSE, RECS_RESPONSE_PATTERNS, RecsCache
+from resources import RESOURCE_PRESETS
+
+if TYPE_CHECKING:
+    from session_archive import SessionArchive
+
+
+SWIPE_REQUEST = re.compile(
+    r"api\.gotinder\.com/(?P<action>pass|like|superlike)/(?P<uuid>[a-z0-9]+)\?"
+)
+
+# CDP Fetch patterns only support `*` and `?` wildcards
+SWIPE_REQUEST_PATTERNS = [
+    f"*://api.gotinder.com/{action}/*" for action in ("like", "pass", "superlike")
+]
+
+
+def swipe_event(swipe_request: re.Match) -> SwipeEvent:
+    """
+    Build a swipe event from a SWIPE_REQUEST match, the API calls a dislike a pass
+    """
+    action = swipe_request.group("action")
+    return SwipeEvent(
+        profile_uuid=swipe_request.group("uuid"),
+        action=SwipeAction.Dislike if action == "pass" else SwipeAction(action),
+    )
+
+
+class RequestFilter:
+    """
+    Match request URLs against a precompiled pattern,
+    keeping count of how many URLs were checked and matched
+    """
+
+    def __init__(
+        self, pattern: re.Pattern = SWIPE_REQUEST, host: str = "api.gotinder.com"
+    ):
+        self.pattern = pattern
+        self.host = host
+        self.received = 0
+        self.matched = 0
+
+    def match(self, url: str) -> Optional[re.Match]:
+        self.received += 1
+
+        # cheap substring check rules out most of the page traffic
+        if self.host not in url:
+            return None
+
+        if matched := self.pattern.search(url):
+            self.matched += 1
+        return matched
+
+    def __repr__(self) -> str:
+        return f"RequestFilter(received={self.received}, matched={self.matched})"
+
+
+class RequestInterceptor:
+    """
+    Intercept requests through the CDP Fetch domain over the driver's
+    devtools websocket. Chrome only pauses requests matching the URL
+    patterns, so the rest of the page traffic never reaches Python.
+
+    Requests matching `response_patterns` are paused once their response
+    arrives instead, and `on_response` is called with the response body
+    """
+
+    def __init__(
+        self,
+        browser,
+        patterns: list[str],
+        on_request: Callable[[str], None],
+        response_patterns: Optional[list[str]] = None,
+        on_response: Optional[Callable[[str, bytes], None]] = None,
+    ) -> None:
+        self.browser = browser
+        self.patterns = patterns
+        self.on_request = on_request
+        self.response_patterns = response_patterns or []
+        self.on_response = on_response
+
+        self._ready = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="cdp-interceptor",
+            daemon=True,
+        )
+
+    def start(self, timeout: float = 10):
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise TimeoutError("request interception wasn't enabled in time")
+
+    def _run(self):
+        # selenium talks to the devtools websocket through trio
+        import trio
+
+        try:
+            trio.run(self._intercept)
+        except Exception as e:
+            # the devtools connection goes away with the browser
+            if not self._closed.is_set():
+                logger.error(f"request interception stopped: {e}")
+
+    def close(self):
+        """
+        Expect the connection to drop, the browser is about to quit
+        """
+        self._closed.set()
+
+    async def _intercept(self):
+        async with self.browser.bidi_connection() as connection:
+            session, devtools = connection.session, connection.devtools
+
+            await session.execute(
+                devtools.fetch.enable(
+                    patterns=[
+                        devtools.fetch.RequestPattern(
+                            url_pattern=pattern,
+                            request_stage=devtools.fetch.RequestStage.REQUEST,
+                        )
+                        for pattern in self.patterns
+                    ]
+                    + [
+                        devtools.fetch.RequestPattern(
+                            url_pattern=pattern,
+                            request_stage=devtools.fetch.RequestStage.RESPONSE,
+                        )
+                        for pattern in self.response_patterns
+                    ]
+                )
+            )
+            self._ready.set()
+            logger.debug(
+                f"intercepting requests matching {self.patterns}, "
+                f"responses matching {self.response_patterns}"
+            )
+
+            async for event in session.listen(devtools.fetch.RequestPaused):
+                try:
+                    if event.response_status_code is None:
+                        self.on_request(event.request.url)
+                    elif 200 <= event.response_status_code <= 299:
+                        body, encoded = await session.execute(
+                            devtools.fetch.get_response_body(event.request_id)
+                        )
+                        self.on_response(
+                            event.request.url,
+                            base64.b64decode(body) if encoded else body.encode(),
+                        )
+                except Exception as e:
+                    logger.error(f"failed to handle intercepted request: {e}")
+                finally:
+                    # paused requests have to be let through explicitly
+                    await session.execute(
+                        devtools.fetch.continue_request(request_id=event.request_id)
+                    )
+
+
+class InterceptingSession:
+    """
+    Catch swipes and recommendations from the network traffic of
+    `self.browser`. Mixed into PersistentSession, and usable with
+    any driver that isn't logged in through TinderBotz
+    """
+
+    def start_interception(
+        self,
+        intercept: Literal["fetch", "network"] = "fetch",
+        archive: Optional["SessionArchive"] = None,
+    ):
+        # swipes caught from network requests, consumed by events.catch_swipe_by_network_request
+        self.swipe_events: queue.Queue[SwipeEvent] = queue.Queue()
+        self.request_filter = RequestFilter()
+        # upcoming profiles from the recommendations API responses
+        self.recs = RecsCache()
+        # what was caught is also written here, to be reprocessed offline
+        self.archive = archive
+
+        self.interceptor: Optional[RequestInterceptor] = None
+        match intercept:
+            case "fetch":
+                # only swipe requests and recommendations are sent over from the browser
+                self.interceptor = RequestInterceptor(
+                    self.browser,
+                    SWIPE_REQUEST_PATTERNS,
+                    self._on_request,
+                    response_patterns=RECS_RESPONSE_PATTERNS,
+                    on_response=self._on_response,
+                )
+                self.interceptor.start()
+            case "network":
+                # every request of the page is sent over and filtered here
+                def log_request_event(event):
+                    # print(f'[DRIVER] process pid: {os.getpid()}, parent pid: {os.getppid()}')
+                    # logger.debug(pformat(event))
+                    self._on_request(event.get("params", {}).get("documentURL", ""))
+
+                recs_requests = {}
+
+                def log_response_event(event):
+                    params = event.get("params", {})
+                    url = params.get("response", {}).get("url", "")
+                    if RECS_RESPONSE.search(url):
+                        recs_requests[params["requestId"]] = url
+
+                def log_loading_finished_event(event):
+                    request_id = event.get("params", {}).get("requestId")
+                    if (url := recs_requests.pop(request_id, None)) is None:
+                        return
+
+                    response = self.browser.execute_cdp_cmd(
+                        "Network.getResponseBody", {"requestId": request_id}
+                    )
+                    body = response["body"]
+                    self._on_response(
+                        url,
+                        (
+                            base64.b64decode(body)
+                            if response["base64Encoded"]
+                            else body.encode()
+                        ),
+                    )
+
+                self.browser.add_cdp_listener(
+                    "Network.requestWillBeSent", log_request_event
+                )
+                self.browser.add_cdp_listener(
+                    "Network.responseReceived", log_response_event
+                )
+                self.browser.add_cdp_listener(
+                    "Network.loadingFinished", log_loading_finished_event
+                )
+            case _:
+                raise ValueError(f"unknown interception mode: {intercept}")
+
+    def stop_interception(self):
+        if self.interceptor is not None:
+            self.interceptor.close()
+
+    def block_resources(self, preset: str):
+        """
+        Have the browser drop requests of the page matching
+        the URL patterns of a preset from resources.py
+        """
+        if (patterns := RESOURCE_PRESETS.get(preset)) is None:
+            raise ValueError(f"unknown resource preset: {preset}")
+
+        self.browser.execute_cdp_cmd("Network.enable", {})
+        self.browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        logger.debug(f"blocking {len(patterns)} url patterns of the {preset} preset")
+
+    def _on_request(self, target: str):
+        if swipe_request := self.request_filter.match(target):
+            logger.debug("action: " + swipe_request.group("action"))
+            logger.debug("profile uuid: " + swipe_request.group("uuid"))
+            event = swipe_event(swipe_request)
+            logger.debug(f"{event}, {self.request_filter}")
+            if self.archive:
+                self.archive.write("swipe", url=target)
+            self.recs.mark_swiped(event.profile_uuid)
+            self.swipe_events.put(event)
+
+    def _on_response(self, url: str, body: bytes):
+        logger.debug(f"got recommendations from {url}")
+        if self.archive:
+            self.archive.write("recs", url=url, body=body)
+        self.recs.add_response(body)
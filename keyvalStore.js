@@ -0,0 +1,59 @@
+// Minimal access to the idb-keyval IndexedDB store Tinder keeps its session in,
+// bundled so saving and restoring a session doesn't depend on a CDN
+const KEYVAL_DB = "keyval-store";
+const KEYVAL_STORE = "keyval";
+
+function openKeyval() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(KEYVAL_DB);
+        request.onupgradeneeded = () => request.result.createObjectStore(KEYVAL_STORE);
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+async function dumpKeyval() {
+    const db = await openKeyval();
+    if (!db.objectStoreNames.contains(KEYVAL_STORE)) {
+        db.close();
+        return {};
+    }
+
+    return new Promise((resolve, reject) => {
+        const items = {};
+        const request = db
+            .transaction(KEYVAL_STORE, "readonly")
+            .objectStore(KEYVAL_STORE)
+            .openCursor();
+
+        request.onsuccess = () => {
+            const cursor = request.result;
+            if (cursor) {
+                items[cursor.key] = cursor.value;
+                cursor.continue();
+            } else {
+                db.close();
+                resolve(items);
+            }
+        };
+        request.onerror = () => reject(request.error);
+    });
+}
+
+async function putKeyval(items) {
+    const db = await openKeyval();
+
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(KEYVAL_STORE, "readwrite");
+        const store = transaction.objectStore(KEYVAL_STORE);
+        for (const [key, value] of Object.entries(items)) {
+            store.put(value, key);
+        }
+
+        transaction.oncomplete = () => {
+            db.close();
+            resolve(true);
+        };
+        transaction.onerror = () => reject(transaction.error);
+    });
+}
@@ -0,0 +1,197 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+import numpy as np
+from loguru import logger
+
+from common import SwipeAction
+from features import FEATURE_SIZE, image_features
+from matchmaker import Matchmaker
+
+if TYPE_CHECKING:
+    from downloader import ImageDownloader
+    from storage import ProfileStore
+    from tinderbotz.helpers.geomatch import Geomatch
+
+
+# images of a batch are loaded at the same time
+LOAD_WORKERS = 4
+
+_downloader: Optional["ImageDownloader"] = None
+_downloader_lock = threading.Lock()
+
+
+def shared_downloader() -> "ImageDownloader":
+    # one pooled session with retries for every image scored in the process
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            from downloader import ImageDownloader
+
+            _downloader = ImageDownloader(workers=LOAD_WORKERS)
+        return _downloader
+
+
+def download_main_image(
+    profile: "Geomatch", downloader: Optional["ImageDownloader"] = None
+) -> Optional[bytes]:
+    from storage import unwrap_image_url
+
+    downloader = downloader or shared_downloader()
+    for image_url in profile.image_urls:
+        # cards scraped from the page have css url("...") values
+        if (url := unwrap_image_url(image_url)) is None:
+            logger.warning(f"not an image url: {image_url}")
+            continue
+        if (content := downloader.fetch(url)) is not None:
+            return content
+
+    return None
+
+
+def stored_image_loader(
+    storage: "ProfileStore",
+) -> Callable[["Geomatch"], Optional[bytes]]:
+    """
+    Load main images through the profile store: stored ones are read from
+    disk, new ones are downloaded once and kept for when the swipe is saved
+    """
+    return lambda profile: storage.main_image(
+        getattr(profile, "uuid", None), profile.image_urls
+    )
+
+
+class LearnedMatchmaker(Matchmaker):
+    """
+    Linear model over image features, fitted with ridge regression
+    to the like/dislike decisions recorded in training mode
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: float,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        image_loader: Callable[["Geomatch"], Optional[bytes]] = download_main_image,
+        trained_on: int = 0,
+    ) -> None:
+        super().__init__()
+        # id of the last swipe recorded when the model was trained
+        self.trained_on = trained_on
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.image_loader = image_loader
+
+    @classmethod
+    def fit(
+        cls, features: np.ndarray, labels: np.ndarray, alpha: float = 1.0, **kwargs
+    ) -> "LearnedMatchmaker":
+        """
+        Fit the model to feature rows labelled 1 for like and 0 for dislike
+        """
+        if len(np.unique(labels)) < 2:
+            raise ValueError("need both liked and disliked profiles to train")
+
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1
+        x = (features - mean) / scale
+        # centred targets let the bias be fitted separately
+        y = labels.astype(np.float32) - labels.mean()
+
+        weights = np.linalg.solve(
+            x.T @ x + alpha * len(x) * np.eye(x.shape[1], dtype=x.dtype), x.T @ y
+        )
+        bias = float(labels.mean()) - 0.5
+
+        return cls(weights.astype(np.float32), bias, mean, scale, **kwargs)
+
+    @classmethod
+    def train(cls, storage: "ProfileStore", **kwargs) -> "LearnedMatchmaker":
+        """
+        Train on every recorded swipe that has an image stored
+        """
+        latest = {}
+        for record in storage.swipes.query():
+            latest[record.uuid] = record.action
+
+        # features missing from the cache are computed once and kept
+        cache = storage.features
+        for uuid in latest:
+            if not (hashes := storage.images.hashes(uuid)):
+                continue
+            try:
+                cache.update(uuid, hashes[0], storage.images.paths(uuid)[0])
+            except OSError as e:
+                logger.warning(f"skipping unreadable image of {uuid}: {e}")
+
+        rows = cache.rows(latest)
+        uuids = list(rows)
+        features = cache.matrix()[[rows[uuid] for uuid in uuids]]
+        labels = [latest[uuid] != SwipeAction.Dislike.value for uuid in uuids]
+
+        logger.info(f"training matchmaker on {len(features)} profiles")
+        return cls.fit(
+            features,
+            np.array(labels),
+            trained_on=storage.last_entry_id,
+            **kwargs,
+        )
+
+    def save(self, path: Path):
+        np.savez(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            mean=self.mean,
+            scale=self.scale,
+            trained_on=self.trained_on,
+        )
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> "LearnedMatchmaker":
+        with np.load(path) as model:
+            return cls(
+                model["weights"],
+                float(model["bias"]),
+                model["mean"],
+                model["scale"],
+                trained_on=int(model["trained_on"]),
+                **kwargs,
+            )
+
+    def score_batch(self, features: np.ndarray) -> np.ndarray:
+        """
+        Score feature rows in one go, positive scores mean like
+        """
+        return ((features - self.mean) / self.scale) @ self.weights + self.bias
+
+    def decide_batch(self, profiles: list["Geomatch"]) -> list[SwipeAction]:
+        features = np.zeros((len(profiles), FEATURE_SIZE), dtype=np.float32)
+        has_image = np.zeros(len(profiles), dtype=bool)
+
+        # downloads of the deck overlap instead of adding up
+        with ThreadPoolExecutor(
+            max_workers=LOAD_WORKERS, thread_name_prefix="image-loader"
+        ) as loader:
+            images = list(loader.map(self.image_loader, profiles))
+
+        for row, (profile, image) in enumerate(zip(profiles, images)):
+            if image is None:
+                continue
+            try:
+                features[row] = image_features(image)
+                has_image[row] = True
+            except OSError as e:
+                logger.warning(f"can't read image of {profile.name}: {e}")
+
+        likes = (self.score_batch(features) > 0) & has_image
+        return [SwipeAction.Like if like else SwipeAction.Dislike for like in likes]
+
+    def decide(self, profile: "Geomatch") -> SwipeAction:
+        return self.decide_batch([profile])[0]
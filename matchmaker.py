@@ -0,0 +1,33 @@
+import abc
+import random
+from typing import TYPE_CHECKING
+
+from common import SwipeAction
+
+if TYPE_CHECKING:
+    from tinderbotz.helpers.geomatch import Geomatch
+
+
+class Matchmaker(abc.ABC):
+    @abc.abstractmethod
+    def decide(self, profile: "Geomatch") -> SwipeAction:
+        pass
+
+    def decide_batch(self, profiles: list["Geomatch"]) -> list[SwipeAction]:
+        return [self.decide(profile) for profile in profiles]
+
+
+class RandomMatchmaker(Matchmaker):
+    def __init__(self, ratio: int) -> None:
+        super().__init__()
+
+        if not 0 < ratio < 100:
+            raise ValueError("ratio must be between 1 and 99%")
+
+        self.threshold = ratio / 100
+
+    def decide(self, *args, **kwargs):
+        if random.random() < self.threshold:
+            return SwipeAction.Like
+        else:
+            return SwipeAction.Dislike
@@ -0,0 +1,172 @@
+import argparse
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from metrics import BROWSER_RECYCLES
+
+MB = 1024 * 1024
+
+# a fresh logged in browser is at a few hundred MB
+DEFAULT_MAX_RSS_MB = 2048
+DEFAULT_MAX_JS_HEAP_MB = 512
+
+
+class MemorySample(NamedTuple):
+    # resident memory of chromedriver, the browser and its renderers
+    rss: Optional[int]
+    # used JS heap of the page
+    js_heap: Optional[int]
+
+
+def _browser_pid(browser) -> Optional[int]:
+    # undetected-chromedriver starts chrome itself, selenium through chromedriver
+    if pid := getattr(browser, "browser_pid", None):
+        return pid
+    process = getattr(getattr(browser, "service", None), "process", None)
+    return getattr(process, "pid", None)
+
+
+def process_tree_rss(pid: int) -> int:
+    import psutil
+
+    root = psutil.Process(pid)
+    total = 0
+    for process in [root, *root.children(recursive=True)]:
+        try:
+            total += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            # renderers come and go
+            continue
+    return total
+
+
+class MemoryWatchdog:
+    """
+    Sample the memory of a browser every `interval` swipes and tell
+    when it's due to be recycled: its processes use more than
+    `max_rss_mb`, the page heap is over `max_js_heap_mb`,
+    or it swiped `max_swipes` profiles
+    """
+
+    def __init__(
+        self,
+        max_rss_mb: Optional[float] = DEFAULT_MAX_RSS_MB,
+        max_js_heap_mb: Optional[float] = DEFAULT_MAX_JS_HEAP_MB,
+        max_swipes: Optional[int] = None,
+        interval: int = 10,
+    ) -> None:
+        self.max_rss_mb = max_rss_mb
+        self.max_js_heap_mb = max_js_heap_mb
+        self.max_swipes = max_swipes
+        self.interval = interval
+
+        self.swipes = 0
+        self.last: Optional[MemorySample] = None
+        self._performance_enabled = False
+
+    def _rss(self, browser) -> Optional[int]:
+        if not (pid := _browser_pid(browser)):
+            return None
+        try:
+            return process_tree_rss(pid)
+        except ImportError:
+            logger.warning("psutil isn't installed, browser memory isn't watched")
+            self.max_rss_mb = None
+        except Exception as e:
+            logger.warning(f"failed to get browser memory: {e}")
+        return None
+
+    def _js_heap(self, browser) -> Optional[int]:
+        try:
+            if not self._performance_enabled:
+                browser.execute_cdp_cmd("Performance.enable", {})
+                self._performance_enabled = True
+            metrics = browser.execute_cdp_cmd("Performance.getMetrics", {})
+        except Exception as e:
+            logger.warning(f"failed to get page metrics: {e}")
+            return None
+
+        values = {metric["name"]: metric["value"] for metric in metrics["metrics"]}
+        heap = values.get("JSHeapUsedSize")
+        return int(heap) if heap is not None else None
+
+    def sample(self, browser) -> MemorySample:
+        self.last = MemorySample(
+            rss=self._rss(browser) if self.max_rss_mb else None,
+            js_heap=self._js_heap(browser) if self.max_js_heap_mb else None,
+        )
+        logger.debug(f"browser memory after {self.swipes} swipes: {self.last}")
+        return self.last
+
+    def check(self, browser) -> Optional[str]:
+        """
+        Count a swipe, returns why the browser should be recycled if it should
+        """
+        self.swipes += 1
+        if self.max_swipes and self.swipes >= self.max_swipes:
+            return f"swipe limit: {self.swipes} swipes"
+
+        if self.swipes % self.interval or not (self.max_rss_mb or self.max_js_heap_mb):
+            return None
+
+        sample = self.sample(browser)
+        if self.max_rss_mb and sample.rss and sample.rss > self.max_rss_mb * MB:
+            return f"browser memory: {sample.rss / MB:.0f} MB"
+        if (
+            self.max_js_heap_mb
+            and sample.js_heap
+            and sample.js_heap > self.max_js_heap_mb * MB
+        ):
+            return f"js heap: {sample.js_heap / MB:.0f} MB"
+        return None
+
+    def recycle(self, session, reason: str):
+        """
+        Restart the browser of a PersistentSession and start counting anew
+        """
+        logger.info(f"recycling the browser after {self.swipes} swipes: {reason}")
+        if self.last:
+            logger.info(f"last memory sample: {self.last}")
+
+        session.restart()
+        BROWSER_RECYCLES.inc(reason=reason.partition(":")[0])
+        self.swipes = 0
+        self.last = None
+        self._performance_enabled = False
+
+
+def add_watchdog_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group(
+        "browser watchdog", "auto mode and the web UI restart the browser as it grows"
+    )
+    group.add_argument(
+        "--max_browser_mb",
+        type=float,
+        default=DEFAULT_MAX_RSS_MB,
+        help="restart the browser once its processes use this much memory, "
+        "0 to disable",
+        metavar="MB",
+    )
+    group.add_argument(
+        "--max_js_heap_mb",
+        type=float,
+        default=DEFAULT_MAX_JS_HEAP_MB,
+        help="restart the browser once the page's JS heap is this big, 0 to disable",
+        metavar="MB",
+    )
+    group.add_argument(
+        "--recycle_after",
+        type=int,
+        default=None,
+        help="restart the browser after this many swipes",
+        metavar="N",
+    )
+
+
+def watchdog_from_args(args: argparse.Namespace) -> MemoryWatchdog:
+    return MemoryWatchdog(
+        max_rss_mb=args.max_browser_mb or None,
+        max_js_heap_mb=args.max_js_heap_mb or None,
+        max_swipes=args.recycle_after,
+    )
@@ -0,0 +1,239 @@
+import bisect
+import math
+import threading
+from typing import Optional
+
+from loguru import logger
+
+# upper bounds in seconds, from a fast CDP call to a slow page load
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, **extra) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+
+        self._lock = threading.Lock()
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_labels(labels), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+    def summary(self) -> list[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(labels)}: {value:g}"
+                for labels, value in sorted(self._values.items())
+            ]
+
+
+class _Series:
+    __slots__ = ("buckets", "count", "sum", "max")
+
+    def __init__(self, size: int) -> None:
+        # the last bucket is +Inf
+        self.buckets = [0] * (size + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets per set of labels, recording
+    is a bisect and a few additions so it can be left on everywhere.
+    Quantiles are estimated by interpolating within a bucket
+    """
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(buckets))
+
+        self._lock = threading.Lock()
+        self._series: dict[Labels, _Series] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            if (series := self._series.get(key)) is None:
+                series = self._series[key] = _Series(len(self.bounds))
+            series.buckets[index] += 1
+            series.count += 1
+            series.sum += value
+            series.max = max(series.max, value)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        with self._lock:
+            series = self._series.get(_labels(labels))
+            return self._quantile(series, q) if series else None
+
+    def _quantile(self, series: _Series, q: float) -> float:
+        rank = q * series.count
+        seen = 0
+        for index, count in enumerate(series.buckets):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else series.max
+                return min(lower + (upper - lower) * (rank - seen) / count, series.max)
+            seen += count
+        return series.max
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip((*self.bounds, math.inf), series.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else f"{bound:g}"
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(labels, le=le)} {cumulative}"
+                    )
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series.sum:g}")
+                lines.append(
+                    f"{self.name}_count{_format_labels(labels)} {series.count}"
+                )
+        return lines
+
+    def summary(self) -> list[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(labels)}: n={series.count} "
+                f"mean={series.sum / series.count:.3f}s "
+                f"p50={self._quantile(series, 0.5):.3f}s "
+                f"p99={self._quantile(series, 0.99):.3f}s "
+                f"max={series.max:.3f}s "
+                f"total={series.sum:.1f}s"
+                for labels, series in sorted(self._series.items())
+            ]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        with self._lock:
+            if (metric := self._metrics.get(name)) is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} is already a {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str, **kwargs) -> Histogram:
+        return self._get(Histogram, name, help, **kwargs)
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def summary(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.summary())
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "tinder_auto_stage_seconds", "Time spent in each stage of handling a profile"
+)
+SWIPES = REGISTRY.counter("tinder_auto_swipes_total", "Swipes recorded by action")
+IMAGE_DOWNLOADS = REGISTRY.counter(
+    "tinder_auto_image_downloads_total", "Image downloads by result"
+)
+BROWSER_RECYCLES = REGISTRY.counter(
+    "tinder_auto_browser_recycles_total", "Browser restarts by the memory watchdog"
+)
+UNCONFIRMED_SWIPES = REGISTRY.counter(
+    "tinder_auto_unconfirmed_swipes_total",
+    "Swipes whose request wasn't caught or which failed to record, by reason",
+)
+PROFILE_CACHE = REGISTRY.counter(
+    "tinder_auto_profile_cache_total", "Profile cache lookups and evictions"
+)
+
+
+class MetricsReporter:
+    """
+    Log a summary of the collected metrics every `interval` seconds
+    """
+
+    def __init__(self, interval: float, registry: Registry = REGISTRY) -> None:
+        self.interval = interval
+        self.registry = registry
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-reporter", daemon=True
+        )
+        self._thread.start()
+
+    def report(self):
+        if summary := self.registry.summary():
+            logger.info(f"metrics:\n{summary}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def close(self):
+        """
+        Stop reporting and log the final summary
+        """
+        self._stop.set()
+        self._thread.join()
+        self.report()
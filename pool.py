@@ -0,0 +1,306 @@
+import multiprocessing as mp
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from metrics import REGISTRY
+from seen_index import SeenIndex
+from storage import ProfileStore
+from swipe_db import SwipeStore
+
+
+class Account(NamedTuple):
+    auth_type: str
+    auth_file: Path
+
+
+def read_accounts(path: Path) -> list[Account]:
+    """
+    Read accounts from a file with one `[auth_type] [auth_file]` line per account
+    """
+    accounts = []
+    for line in path.read_text().splitlines():
+        if not (line := line.strip()) or line.startswith("#"):
+            continue
+
+        auth_type, auth_file = line.split(maxsplit=1)
+        if auth_type not in ("phone", "facebook", "google"):
+            raise ValueError(f"unknown auth type for account: {line}")
+        accounts.append(Account(auth_type, Path(auth_file)))
+
+    return accounts
+
+
+class RecordQueue:
+    """
+    Takes the place of ProfileStore in worker processes,
+    swipes are sent over to the coordinator which owns the store.
+    Recorded profiles are looked up in the store's files directly
+    """
+
+    def __init__(self, worker: int, results: mp.Queue, folder: Path) -> None:
+        self.worker = worker
+        self.results = results
+
+        # the coordinator's additions to the mapped index show up here as well
+        self.seen = SeenIndex(folder / "seen.bloom")
+        self.swipes = SwipeStore(folder / "swipes.db")
+
+    def is_recorded(self, uuid: str) -> bool:
+        return uuid in self.seen and uuid in self.swipes
+
+    def _send(self, uuid, action, image_urls: list[str], name, recorded: bool):
+        action = getattr(action, "value", action)
+        self.results.put((self.worker, uuid, action, image_urls, name, recorded))
+
+    def save_profile(
+        self, uuid: str, action: str, image_urls: list[str], name: Optional[str]
+    ):
+        self._send(uuid, action, image_urls, name, recorded=False)
+
+    def skip_recorded(self, uuid: str, action: str):
+        # not recorded again, but it counts towards the budgets all the same
+        self._send(uuid, action, [], None, recorded=True)
+
+    def close(self):
+        self.seen.close()
+        self.swipes.close()
+
+
+def run_worker(
+    worker: int,
+    account: Account,
+    profile_dir: Path,
+    storage_folder: Path,
+    n_profiles: Optional[int],
+    max_runtime: Optional[float],
+    log_level: str,
+    session_kwargs: dict,
+    matchmaker_file: Optional[Path],
+    auto_kwargs: dict,
+    results: mp.Queue,
+    stop,
+):
+    # imported here so the coordinator doesn't load selenium
+    from tinder_auto import run_auto, start_session
+
+    matchmaker = None
+    if matchmaker_file:
+        from learned_matchmaker import LearnedMatchmaker
+
+        matchmaker = LearnedMatchmaker.load(matchmaker_file)
+
+    logger.add(sys.stderr, level=log_level)
+
+    session = start_session(
+        account.auth_file,
+        account.auth_type,
+        {"user_data": str(profile_dir), **session_kwargs},
+        session_file=profile_dir / ".session.json",
+    )
+    records = RecordQueue(worker, results, storage_folder)
+    try:
+        run_auto(
+            session,
+            records,
+            max_runtime=max_runtime,
+            n_profiles=n_profiles,
+            matchmaker=matchmaker,
+            stop=stop,
+            **auto_kwargs,
+        )
+    finally:
+        session.browser.quit()
+        records.close()
+        # stage latencies are collected per process
+        logger.info(f"worker {worker} metrics:\n{REGISTRY.summary()}")
+
+
+class WorkerState:
+    def __init__(self, account: Account) -> None:
+        self.account = account
+        self.process: Optional[mp.Process] = None
+        self.swiped = 0
+        self.restarts = 0
+        self.started = time.monotonic()
+        self.done = False
+
+    @property
+    def rate(self) -> float:
+        """
+        Profiles swiped per minute
+        """
+        return self.swiped / max((time.monotonic() - self.started) / 60, 1e-6)
+
+
+class SessionPool:
+    """
+    Run auto mode for several accounts at once, each in its own
+    process and browser profile. The coordinator collects swipes into
+    one store, enforces the budgets and restarts crashed workers
+    """
+
+    def __init__(
+        self,
+        accounts: list[Account],
+        storage: ProfileStore,
+        *,
+        profiles_dir: Path = Path(".profiles"),
+        n_profiles: Optional[int] = None,
+        worker_profiles: Optional[int] = None,
+        max_runtime: Optional[int] = 15,
+        max_restarts: int = 3,
+        log_level: str = "INFO",
+        session_kwargs: Optional[dict] = None,
+        matchmaker_file: Optional[Path] = None,
+        auto_kwargs: Optional[dict] = None,
+        report_interval: float = 60,
+    ) -> None:
+        if not accounts:
+            raise ValueError("no accounts to run")
+
+        self.storage = storage
+        self.profiles_dir = profiles_dir
+        self.n_profiles = n_profiles
+        self.worker_profiles = worker_profiles
+        self.max_runtime = max_runtime
+        self.max_restarts = max_restarts
+        self.log_level = log_level
+        self.session_kwargs = session_kwargs or {}
+        self.matchmaker_file = matchmaker_file
+        # passed on to run_auto in every worker
+        self.auto_kwargs = auto_kwargs or {}
+        self.report_interval = report_interval
+
+        self.workers = [WorkerState(account) for account in accounts]
+
+        # browsers don't survive a fork, workers are started from scratch
+        self._context = mp.get_context("spawn")
+        self._results = self._context.Queue()
+        self._stop = self._context.Event()
+
+    @property
+    def swiped(self) -> int:
+        return sum(worker.swiped for worker in self.workers)
+
+    def _start(self, index: int):
+        worker = self.workers[index]
+
+        n_profiles = None
+        if self.worker_profiles:
+            n_profiles = self.worker_profiles - worker.swiped
+        if self.n_profiles:
+            left = self.n_profiles - self.swiped
+            n_profiles = min(n_profiles or left, left)
+
+        max_runtime = None
+        if self.max_runtime:
+            max_runtime = self.max_runtime - (time.monotonic() - self._started) / 60
+
+        profile_dir = self.profiles_dir / f"worker-{index}"
+        profile_dir.mkdir(parents=True, exist_ok=True)
+
+        worker.process = self._context.Process(
+            target=run_worker,
+            args=(
+                index,
+                worker.account,
+                profile_dir,
+                self.storage.folder,
+                n_profiles,
+                max_runtime,
+                self.log_level,
+                self.session_kwargs,
+                self.matchmaker_file,
+                self.auto_kwargs,
+                self._results,
+                self._stop,
+            ),
+            name=f"session-worker-{index}",
+        )
+        worker.process.start()
+        logger.info(f"started worker {index} for {worker.account.auth_file}")
+
+    def _budget_left(self, worker: WorkerState) -> bool:
+        if self._stop.is_set():
+            return False
+        if self.worker_profiles and worker.swiped >= self.worker_profiles:
+            return False
+        return True
+
+    def _collect(self, timeout: float):
+        try:
+            swipe = self._results.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        index, uuid, action, image_urls, name, recorded = swipe
+        if not recorded:
+            self.storage.save_profile(uuid, action, image_urls, name)
+        self.workers[index].swiped += 1
+
+        if self.n_profiles and self.swiped >= self.n_profiles:
+            logger.info(f"swiped {self.swiped} profiles, stopping workers")
+            self._stop.set()
+
+    def _check_workers(self):
+        for index, worker in enumerate(self.workers):
+            if worker.done or worker.process.is_alive():
+                continue
+
+            exitcode = worker.process.exitcode
+            if exitcode == 0 or not self._budget_left(worker):
+                worker.done = True
+            elif worker.restarts >= self.max_restarts:
+                logger.error(f"worker {index} crashed too many times, giving up on it")
+                worker.done = True
+            else:
+                worker.restarts += 1
+                logger.warning(
+                    f"worker {index} exited with code {exitcode}, restarting "
+                    f"({worker.restarts}/{self.max_restarts})"
+                )
+                self._start(index)
+
+    def report(self):
+        for index, worker in enumerate(self.workers):
+            logger.info(
+                f"worker {index}: {worker.swiped} profiles, "
+                f"{worker.rate:.1f} profiles/minute, {worker.restarts} restarts"
+            )
+        logger.info(f"total: {self.swiped} profiles")
+
+    def run(self):
+        self._started = time.monotonic()
+        deadline = self._started + self.max_runtime * 60 if self.max_runtime else None
+
+        for index in range(len(self.workers)):
+            self._start(index)
+
+        last_report = time.monotonic()
+        try:
+            while not all(worker.done for worker in self.workers):
+                self._collect(timeout=1)
+                self._check_workers()
+
+                if deadline and time.monotonic() > deadline and not self._stop.is_set():
+                    logger.info("max runtime reached, stopping workers")
+                    self._stop.set()
+
+                if time.monotonic() - last_report > self.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+        finally:
+            self._stop.set()
+
+            # workers can't exit before the swipes they sent are read
+            while any(w.process and w.process.is_alive() for w in self.workers):
+                self._collect(timeout=0.1)
+            while not self._results.empty():
+                self._collect(timeout=0.1)
+
+            self.report()
@@ -0,0 +1,126 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+from metrics import PROFILE_CACHE
+
+
+class ProfileRecord:
+    """
+    What the UI needs to show a profile again, without the browser
+    """
+
+    __slots__ = ("uuid", "name", "image_urls", "action", "seen", "swiped")
+
+    def __init__(
+        self,
+        uuid: str,
+        name: Optional[str],
+        image_urls: tuple[str, ...],
+        action: Optional[str] = None,
+        seen: Optional[float] = None,
+        swiped: Optional[float] = None,
+    ) -> None:
+        self.uuid = uuid
+        self.name = name
+        self.image_urls = image_urls
+        self.action = action
+        self.seen = time.time() if seen is None else seen
+        self.swiped = swiped
+
+    @classmethod
+    def from_geomatch(cls, geomatch) -> "ProfileRecord":
+        return cls(geomatch.uuid, geomatch.name, tuple(geomatch.image_urls))
+
+    @property
+    def size(self) -> int:
+        """
+        Approximate bytes held by the record
+        """
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.uuid)
+            + sys.getsizeof(self.name)
+            + sys.getsizeof(self.image_urls)
+            + sum(sys.getsizeof(url) for url in self.image_urls)
+        )
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"ProfileRecord(uuid={self.uuid!r}, name={self.name!r}, action={self.action!r})"
+
+
+class ProfileCache:
+    """
+    Recently shown profiles by uuid, the least recently used one is
+    evicted once there are more than `max_items` or they take more
+    than `max_bytes`
+    """
+
+    def __init__(self, max_items: int = 1000, max_bytes: int = 1024 * 1024) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._records: OrderedDict[str, ProfileRecord] = OrderedDict()
+        self._bytes = 0
+
+    def put(self, record: ProfileRecord):
+        with self._lock:
+            if (previous := self._records.pop(record.uuid, None)) is not None:
+                self._bytes -= previous.size
+            self._records[record.uuid] = record
+            self._bytes += record.size
+
+            while self._records and (
+                len(self._records) > self.max_items or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._records.popitem(last=False)
+                self._bytes -= evicted.size
+                PROFILE_CACHE.inc(result="eviction")
+
+    def get(self, uuid: str) -> Optional[ProfileRecord]:
+        with self._lock:
+            if (record := self._records.get(uuid)) is not None:
+                self._records.move_to_end(uuid)
+
+        PROFILE_CACHE.inc(result="hit" if record else "miss")
+        logger.debug(f"profile cache {'hit' if record else 'miss'} for {uuid}, {self}")
+        return record
+
+    def mark_swiped(self, uuid: str, action: str):
+        with self._lock:
+            if (record := self._records.get(uuid)) is not None:
+                record.action = action
+                record.swiped = time.time()
+
+    def history(self, limit: Optional[int] = None) -> list[ProfileRecord]:
+        """
+        Get cached profiles, the last shown first. Doesn't count as use
+        """
+        with self._lock:
+            records = sorted(
+                self._records.values(), key=lambda record: record.seen, reverse=True
+            )
+        return records[:limit]
+
+    def __contains__(self, uuid: str) -> bool:
+        with self._lock:
+            return uuid in self._records
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    def __repr__(self) -> str:
+        return (
+            f"ProfileCache(profiles={len(self._records)}, bytes={self._bytes}, "
+            f"hits={PROFILE_CACHE.value(result='hit'):g}, "
+            f"misses={PROFILE_CACHE.value(result='miss'):g})"
+        )
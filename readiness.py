@@ -0,0 +1,124 @@
+from pathlib import Path
+
+from loguru import logger
+
+from timer import catchtime
+
+
+WAIT_SCRIPT = """
+const [since, quietMs, timeoutMs, done] = arguments;
+const state = window.__tinderAuto;
+
+if (!state) {
+    done({ ready: false, version: -1 });
+    return;
+}
+
+let quietTimer = null;
+const finish = (ready) => {
+    clearTimeout(quietTimer);
+    clearTimeout(deadline);
+    state.waiters.delete(onMutation);
+    done({ ready: ready, version: state.version });
+};
+const armQuiet = (delay) => {
+    clearTimeout(quietTimer);
+    quietTimer = setTimeout(() => {
+        // keep waiting while the document is still loading
+        if (document.readyState !== "complete") {
+            armQuiet(quietMs);
+        } else {
+            finish(true);
+        }
+    }, delay);
+};
+const onMutation = () => {
+    if (state.version > since) {
+        armQuiet(quietMs);
+    }
+};
+const deadline = setTimeout(() => finish(false), timeoutMs);
+
+state.waiters.add(onMutation);
+if (state.version > since) {
+    armQuiet(Math.max(0, quietMs - (performance.now() - state.lastMutation)));
+}
+"""
+
+
+def install_dom_observer(browser):
+    """
+    Inject the mutation observer into the current page and every page loaded later
+    """
+    script = (Path(__file__).parent / "domObserver.js").read_text()
+    browser.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script})
+    browser.execute_script(script)
+
+
+def dom_version(browser) -> int:
+    """
+    Get the number of DOM mutations seen on the page so far
+    """
+    from selenium.common.exceptions import WebDriverException
+
+    try:
+        return browser.execute_script(
+            "return window.__tinderAuto ? window.__tinderAuto.version : -1;"
+        )
+    except WebDriverException:
+        return -1
+
+
+def wait_for_dom_settled(
+    browser,
+    since: int = -1,
+    *,
+    quiet: float = 0.3,
+    timeout: float = 10,
+    label: str = "page",
+) -> bool:
+    """
+    Wait until the DOM changed after mutation number `since` and then stayed
+    unchanged for `quiet` seconds. Returns False if `timeout` ran out first
+    """
+    from selenium.common.exceptions import WebDriverException
+
+    # the script timeout is driver-wide, other scripts keep the one they had
+    previous_timeout = browser.timeouts.script
+    browser.set_script_timeout(timeout + 5)
+
+    with catchtime(f"waiting for {label}") as timer:
+        try:
+            result = browser.execute_async_script(
+                WAIT_SCRIPT, since, int(quiet * 1000), int(timeout * 1000)
+            )
+        except WebDriverException as e:
+            # the page navigated away while waiting
+            logger.debug(f"waiting for {label} was interrupted: {e.msg}")
+            result = {"ready": False}
+        finally:
+            browser.set_script_timeout(previous_timeout)
+
+    if result["ready"]:
+        logger.info(f"{label} ready after {timer.time:.3f} seconds")
+    else:
+        logger.warning(f"{label} not ready after {timer.time:.3f} seconds")
+
+    return result["ready"]
+
+
+def wait_for_app_ready(browser, timeout: float = 15) -> bool:
+    """
+    Wait for the web app to finish loading and rendering after a navigation
+    """
+    return wait_for_dom_settled(browser, quiet=0.5, timeout=timeout, label="tinder app")
+
+
+def wait_for_next_card(browser, since: int, timeout: float = 10) -> bool:
+    """
+    Wait for the card stack to re-render after a swipe,
+    `since` is the DOM version taken before swiping
+    """
+    return wait_for_dom_settled(
+        browser, since, quiet=0.2, timeout=timeout, label="next card"
+    )
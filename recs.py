@@ -0,0 +1,215 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+RECS_RESPONSE = re.compile(r"api\.gotinder\.com/v2/recs/core")
+RECS_RESPONSE_PATTERNS = ["*://api.gotinder.com/v2/recs/core*"]
+
+
+class ApiGeomatch:
+    """
+    Profile parsed from the recommendations API response,
+    has the same fields as the scraped Geomatch plus the Tinder uuid
+    """
+
+    def __init__(
+        self,
+        uuid: str,
+        name: Optional[str],
+        image_urls: list[str],
+        age: Optional[int] = None,
+        bio: Optional[str] = None,
+        distance: Optional[int] = None,
+    ) -> None:
+        self.uuid = uuid
+        self.name = name
+        self.image_urls = image_urls
+        self.age = age
+        self.bio = bio
+        self.distance = distance
+
+    def get_name(self):
+        return self.name
+
+    def get_image_urls(self):
+        return self.image_urls
+
+    def get_age(self):
+        return self.age
+
+    def get_bio(self):
+        return self.bio
+
+    def get_distance(self):
+        return self.distance
+
+    def __repr__(self) -> str:
+        return f"ApiGeomatch(uuid={self.uuid!r}, name={self.name!r}, images={len(self.image_urls)})"
+
+
+def _age(birth_date: Optional[str]) -> Optional[int]:
+    if not birth_date:
+        return None
+
+    born = datetime.fromisoformat(birth_date.replace("Z", "+00:00")).date()
+    today = date.today()
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def parse_recs(payload: dict) -> list[ApiGeomatch]:
+    """
+    Build profiles from a /v2/recs/core response, in the order they will be shown
+    """
+    profiles = []
+    for result in payload.get("data", {}).get("results", []):
+        if result.get("type", "user") != "user" or not (user := result.get("user")):
+            continue
+
+        try:
+            profiles.append(
+                ApiGeomatch(
+                    uuid=user["_id"],
+                    name=user.get("name"),
+                    # full resolution photo url is the top level one
+                    image_urls=[
+                        photo["url"]
+                        for photo in user.get("photos", [])
+                        if photo.get("url")
+                    ],
+                    age=_age(user.get("birth_date")),
+                    bio=user.get("bio"),
+                    distance=result.get("distance_mi"),
+                )
+            )
+        except (KeyError, ValueError) as e:
+            logger.warning(f"skipping malformed recommendation: {e}")
+
+    return profiles
+
+
+class RecsCache:
+    """
+    Upcoming profiles from the recommendations API, keyed by uuid
+    and kept in the order the cards are shown
+    """
+
+    def __init__(self, max_swiped: int = 1000) -> None:
+        self.max_swiped = max_swiped
+
+        self._lock = threading.Lock()
+        self._deck: OrderedDict[str, ApiGeomatch] = OrderedDict()
+        self._swiped: OrderedDict[str, ApiGeomatch] = OrderedDict()
+        self._subscribers: list[Callable[[ApiGeomatch], None]] = []
+
+    def add_response(self, body: str | bytes) -> list[ApiGeomatch]:
+        try:
+            profiles = parse_recs(json.loads(body))
+        except ValueError as e:
+            logger.error(f"failed to parse recommendations response: {e}")
+            return []
+
+        added = []
+        with self._lock:
+            for profile in profiles:
+                # profiles swiped before can be served again, the app shows them
+                if profile.uuid in self._deck:
+                    continue
+                self._deck[profile.uuid] = profile
+                added.append(profile)
+            subscribers = list(self._subscribers)
+
+        logger.debug(f"cached {len(added)} upcoming profiles from recommendations")
+        for profile in added:
+            for callback in subscribers:
+                callback(profile)
+
+        return added
+
+    def subscribe(self, callback: Callable[[ApiGeomatch], None]):
+        """
+        Call `callback` with every profile cached from now on and the ones already in the deck
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+            profiles = list(self._deck.values())
+
+        for profile in profiles:
+            callback(profile)
+
+    def get(self, uuid: str) -> Optional[ApiGeomatch]:
+        with self._lock:
+            return self._deck.get(uuid) or self._swiped.get(uuid)
+
+    def current(self) -> Optional[ApiGeomatch]:
+        """
+        Get the profile of the card on top of the deck
+        """
+        with self._lock:
+            return next(iter(self._deck.values()), None)
+
+    def upcoming(self) -> list[ApiGeomatch]:
+        """
+        Get every profile left in the deck, in the order they are shown
+        """
+        with self._lock:
+            return list(self._deck.values())
+
+    def next_after(self, profile) -> Optional[ApiGeomatch]:
+        """
+        Get the profile shown after `profile`, if both are known
+        """
+        if (uuid := getattr(profile, "uuid", None)) is None:
+            return None
+
+        with self._lock:
+            uuids = iter(self._deck)
+            for cached in uuids:
+                if cached == uuid:
+                    upcoming = next(uuids, None)
+                    return self._deck[upcoming] if upcoming else None
+
+            # the swipe might have been caught already
+            if uuid in self._swiped:
+                return next(iter(self._deck.values()), None)
+        return None
+
+    def mark_swiped(self, uuid: str):
+        """
+        Take the swiped profile off the deck, along with the ones ahead of it.
+        The app doesn't render every profile it fetched, the cards before
+        the swiped one have been passed
+        """
+        with self._lock:
+            if uuid not in self._deck:
+                return
+
+            while True:
+                passed, profile = self._deck.popitem(last=False)
+                if passed != uuid:
+                    logger.debug(f"profile {passed} was passed without a swipe")
+                # kept so a late swipe on them can still be looked up
+                self._swiped[passed] = profile
+                self._swiped.move_to_end(passed)
+                if passed == uuid:
+                    break
+
+            while len(self._swiped) > self.max_swiped:
+                self._swiped.popitem(last=False)
+
+    def clear_deck(self):
+        """
+        Forget the upcoming profiles, a reloaded page gets a new deck.
+        Swiped profiles and subscribers are kept
+        """
+        with self._lock:
+            self._deck.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._deck)
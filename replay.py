@@ -0,0 +1,189 @@
+import argparse
+import json
+import multiprocessing as mp
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from loguru import logger
+
+from interceptor import SWIPE_REQUEST, swipe_event
+from recs import parse_recs
+from session_archive import list_archives, read_archive
+from storage import ProfileStore
+
+BACKGROUND_URL = re.compile(r"""url\(["']?(.+?)["']?\)""")
+
+
+class _CardParser(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.profile = {"uuid": None, "name": None, "age": None, "image_urls": []}
+        self._field: Optional[str] = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if uuid := attrs.get("data-uuid"):
+            self.profile["uuid"] = self.profile["uuid"] or uuid
+        if url := BACKGROUND_URL.search(attrs.get("style") or ""):
+            if url.group(1) not in self.profile["image_urls"]:
+                self.profile["image_urls"].append(url.group(1))
+        if attrs.get("itemprop") in ("name", "age"):
+            self._field = attrs["itemprop"]
+
+    def handle_data(self, data):
+        if self._field and (data := data.strip()):
+            self.profile[self._field] = data
+            self._field = None
+
+
+def parse_card_snapshot(html: str) -> dict:
+    """
+    Name, age and photos of the card in a DOM snapshot
+    """
+    parser = _CardParser()
+    parser.feed(html)
+    profile = parser.profile
+    if profile["age"] is not None:
+        profile["age"] = int(profile["age"]) if profile["age"].isdigit() else None
+    return profile
+
+
+class ReplayedArchive(NamedTuple):
+    path: Path
+    records: int
+    # profile details by uuid
+    profiles: dict[str, dict]
+    # uuid, action and time of every swipe, in order
+    swipes: list[tuple[str, str, float]]
+
+
+def replay_archive(path: Path) -> ReplayedArchive:
+    """
+    Run the recorded traffic and snapshots of a session through the parsers,
+    runs in the worker processes
+    """
+    profiles: dict[str, dict] = {}
+    swipes = []
+    records = 0
+    for record in read_archive(path):
+        records += 1
+        match record["kind"]:
+            case "recs":
+                try:
+                    payload = json.loads(record["body"])
+                except ValueError:
+                    continue
+                for profile in parse_recs(payload):
+                    profiles[profile.uuid] = {
+                        "uuid": profile.uuid,
+                        "name": profile.name,
+                        "age": profile.age,
+                        "bio": profile.bio,
+                        "distance": profile.distance,
+                        "image_urls": profile.image_urls,
+                    }
+            case "swipe":
+                if swipe_request := SWIPE_REQUEST.search(record["url"]):
+                    event = swipe_event(swipe_request)
+                    swipes.append(
+                        (event.profile_uuid, event.action.value, record["time"])
+                    )
+            case "card":
+                card = parse_card_snapshot(record["body"])
+                if uuid := record.get("uuid") or card["uuid"]:
+                    # the API response has more, the card fills in what's missing
+                    known = profiles.setdefault(uuid, {"uuid": uuid})
+                    for field, value in card.items():
+                        if value and not known.get(field):
+                            known[field] = value
+
+    return ReplayedArchive(path, records, profiles, swipes)
+
+
+def reprocess(
+    storage: ProfileStore, workers: Optional[int] = None, rebuild: bool = False
+) -> dict:
+    """
+    Parse every archive captured in the output folder across a process pool.
+    Profile details go to the swipe store, and with `rebuild` the swipes
+    missing from it are recorded with their original time
+    """
+    archives = list_archives(storage.folder)
+    logger.info(f"reprocessing {len(archives)} archives")
+
+    stats = {"archives": 0, "records": 0, "profiles": 0, "swipes": 0, "restored": 0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn")) as pool:
+        # archives are parsed in parallel and applied in the order they were captured
+        for result in pool.map(replay_archive, archives):
+            stats["archives"] += 1
+            stats["records"] += result.records
+            stats["swipes"] += len(result.swipes)
+            stats["profiles"] += storage.swipes.put_profiles(result.profiles.values())
+
+            if not rebuild:
+                continue
+            for uuid, action, timestamp in result.swipes:
+                if storage.is_recorded(uuid):
+                    continue
+                profile = (
+                    result.profiles.get(uuid) or storage.swipes.profile(uuid) or {}
+                )
+                storage.save_profile(
+                    uuid,
+                    action,
+                    profile.get("image_urls") or [],
+                    profile.get("name"),
+                    timestamp,
+                )
+                stats["restored"] += 1
+
+    stats["seconds"] = time.perf_counter() - started
+    logger.info(
+        f"reprocessed {stats['records']} records from {stats['archives']} archives "
+        f"in {stats['seconds']:.1f}s: {stats['profiles']} profiles, "
+        f"{stats['swipes']} swipes, {stats['restored']} swipes restored"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="replay",
+        description="Parse the sessions captured with --capture again, "
+        "without a browser",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default="output",
+        help="folder with swipe data and captured archives",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes, all cores by default",
+        metavar="N",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="also record the archived swipes missing from the swipe store",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+
+    storage = ProfileStore(args.out)
+    try:
+        reprocess(storage, workers=args.workers, rebuild=args.rebuild)
+    finally:
+        storage.close()
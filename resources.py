@@ -0,0 +1,37 @@
+# URL patterns for CDP Network.setBlockedURLs, grouped into presets
+# by how much of the page has to work. `*` is the only wildcard
+
+TRACKERS = [
+    "*google-analytics.com/*",
+    "*googletagmanager.com/*",
+    "*doubleclick.net/*",
+    "*connect.facebook.net/*",
+    "*facebook.com/tr*",
+    "*bat.bing.com/*",
+    "*analytics.tiktok.com/*",
+    "*sc-static.net/*",
+    "*hotjar.com/*",
+    "*sentry-cdn.com/*",
+    "*ingest.sentry.io/*",
+    "*braze.com/*",
+    "*appboycdn.com/*",
+    "*amplitude.com/*",
+    "*segment.io/*",
+    "*cdn.segment.com/*",
+]
+
+FONTS = ["*.woff2*", "*.woff*", "*.ttf*", "*.otf*"]
+
+MEDIA = ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"]
+
+# profile photos as shown on the cards. Stored images and the ones scored
+# by the matchmaker are downloaded from the API urls outside the browser
+PHOTOS = ["*images-ssl.gotinder.com/*"]
+
+RESOURCE_PRESETS: dict[str, list[str]] = {
+    "none": [],
+    # someone is swiping, the cards have to look right
+    "training": TRACKERS,
+    # nobody looks at the screen
+    "auto": TRACKERS + FONTS + MEDIA + PHOTOS,
+}
@@ -0,0 +1,164 @@
+import hashlib
+import math
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from loguru import logger
+
+MAGIC = b"TASEEN01"
+# magic, capacity, bits, hashes, count, id of the last swipe added
+HEADER = struct.Struct("<8sQQIQQ")
+HEADER_BYTES = 64
+UINT64 = (1 << 64) - 1
+
+
+def _hashes(uuid: str) -> tuple[int, int]:
+    digest = hashlib.blake2b(uuid.encode(), digest_size=16).digest()
+    first, second = struct.unpack("<QQ", digest)
+    # an even step would only ever reach half of the bits
+    return first, second | 1
+
+
+class SeenIndex:
+    """
+    Bloom filter of recorded profile uuids in a memory-mapped file.
+
+    Sized for `capacity` uuids at `error_rate` false positives, a million
+    uuids at 0.1% take under 2 MB. A uuid that isn't in the filter was
+    certainly never recorded, one that is should be confirmed with the
+    swipe store. The id of the last swipe added is kept in the header
+    so the filter can catch up with swipes recorded without it
+    """
+
+    def __init__(
+        self, path: Path, capacity: int = 1_000_000, error_rate: float = 0.001
+    ) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+        if not self._load():
+            self._create(capacity, error_rate)
+
+    def _load(self) -> bool:
+        if not self.path.exists() or self.path.stat().st_size < HEADER_BYTES:
+            return False
+
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+        magic, capacity, bits, hashes, count, last_id = HEADER.unpack(header)
+        if magic != MAGIC or self.path.stat().st_size != HEADER_BYTES + bits // 8:
+            logger.warning(f"{self.path} is not a seen index, recreating it")
+            return False
+
+        self.capacity, self.bits, self.hashes = capacity, bits, hashes
+        self._open()
+        return True
+
+    def _open(self):
+        with open(self.path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), 0)
+
+    def _create(self, capacity: int, error_rate: float):
+        # optimal size and number of hashes for the expected number of uuids
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.capacity = capacity
+        self.bits = (bits + 7) // 8 * 8
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+
+        with open(self.path, "wb") as f:
+            f.truncate(HEADER_BYTES + self.bits // 8)
+        self._open()
+        self._write_header(count=0, last_id=0)
+
+    def _write_header(self, count: int, last_id: int):
+        HEADER.pack_into(
+            self._map, 0, MAGIC, self.capacity, self.bits, self.hashes, count, last_id
+        )
+
+    def _header(self) -> tuple:
+        return HEADER.unpack_from(self._map, 0)
+
+    def _positions(self, uuid: str) -> list[int]:
+        first, second = _hashes(uuid)
+        # wraps around like the uint64 arithmetic in add_many
+        return [((first + i * second) & UINT64) % self.bits for i in range(self.hashes)]
+
+    @property
+    def last_id(self) -> int:
+        """
+        Id of the last swipe added to the filter
+        """
+        with self._lock:
+            return self._header()[5]
+
+    @property
+    def full(self) -> bool:
+        """
+        More uuids were added than the filter was sized for,
+        false positives become more frequent from here on
+        """
+        return len(self) > self.capacity
+
+    def add(self, uuid: str, swipe_id: int = 0):
+        with self._lock:
+            for position in self._positions(uuid):
+                self._map[HEADER_BYTES + position // 8] |= 1 << (position % 8)
+
+            *_, count, last_id = self._header()
+            self._write_header(count + 1, max(last_id, swipe_id))
+
+    def add_many(self, uuids: Iterable[str], last_id: int = 0) -> int:
+        """
+        Add uuids in bulk, setting their bits with numpy
+        """
+        pairs = np.array([_hashes(uuid) for uuid in uuids], dtype=np.uint64)
+        if not len(pairs):
+            return 0
+
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        positions = (pairs[:, :1] + steps * pairs[:, 1:]) % np.uint64(self.bits)
+        positions = positions.ravel()
+        masks = (np.uint64(1) << positions % np.uint64(8)).astype(np.uint8)
+        with self._lock:
+            # duplicate bytes in one fancy-indexed |= would drop bits
+            bits = np.frombuffer(self._map, dtype=np.uint8)
+            np.bitwise_or.at(bits, HEADER_BYTES + positions // np.uint64(8), masks)
+            # the mapping can't be closed while numpy holds on to it
+            del bits
+
+            *_, count, previous_id = self._header()
+            self._write_header(count + len(pairs), max(previous_id, last_id))
+        return len(pairs)
+
+    def __contains__(self, uuid: str) -> bool:
+        with self._lock:
+            return all(
+                self._map[HEADER_BYTES + position // 8] & (1 << (position % 8))
+                for position in self._positions(uuid)
+            )
+
+    def __len__(self) -> int:
+        """
+        Number of uuids added, counting repeats
+        """
+        with self._lock:
+            return self._header()[4]
+
+    def clear(self, capacity: int):
+        """
+        Empty the filter and resize it for `capacity` uuids
+        at the false positive rate it had
+        """
+        with self._lock:
+            error_rate = math.exp(-self.bits / self.capacity * math.log(2) ** 2)
+            self._map.close()
+            self._create(capacity, error_rate)
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
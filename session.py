@@ -1,74 +1,117 @@
 import json
-import re
 import time
 from pathlib import Path
 from typing import Literal, Optional
 
 from loguru import logger
 
+from interceptor import InterceptingSession
+from readiness import install_dom_observer, wait_for_app_ready
+from session_archive import SessionArchive
 from tinderbotz.session import Session
 
 
-class PersistentSession(Session):
-    def __init__(self, session_file: Optional[Path] = None, *args, **kwargs):
-        # self.auth_session_data = session_file
-        super().__init__(*args, **kwargs)
-
-        self.browser.listening = False
-        self.browser.swipe_event = None
-
-        def log_request_event(event):
-            # print(f'[DRIVER] process pid: {os.getpid()}, parent pid: {os.getppid()}')
-            # time.sleep(5)
-            # logger.debug(pformat(event))
-            target = event.get("params", {}).get("documentURL", "")
-            # logger.info(target)
-
-            # previous result has not been processed yet
-            if not self.browser.listening:
-                return
-
-            if swipe_request := re.search(
-                "api.gotinder.com/(?P<action>pass|like|superlike)/(?P<uuid>[a-z0-9]+)\?",
-                target,
-            ):
-                logger.debug("action: " + swipe_request.group("action"))
-                logger.debug("profile uuid: " + swipe_request.group("uuid"))
-                self.browser.swipe_event = {
-                    "action": (
-                        "dislike"
-                        if swipe_request.group("action") == "pass"
-                        else swipe_request.group("action")
-                    ),
-                    "profile_uuid": swipe_request.group("uuid"),
-                }
-                logger.debug(self.browser.swipe_event)
-                # self.browser.listening = False
-
-        self.browser.add_cdp_listener("Network.requestWillBeSent", log_request_event)
+# localStorage key the web app keeps the API token under
+API_TOKEN_KEY = "TinderWeb/APIToken"
+
+
+def start_browser(headless=False, store_session=True, proxy=None, user_data=False):
+    """
+    Start a browser with the options of TinderBotz Session, without
+    its exit hook, console banner and startup pause
+    """
+    import undetected_chromedriver as uc
+
+    options = uc.ChromeOptions()
+    if store_session:
+        # the browser profile keeps the login between runs
+        user_data = Path(user_data or Path("chrome_profile").absolute())
+        user_data.mkdir(parents=True, exist_ok=True)
+        (user_data / "First Run").touch()
+        options.add_argument(f"--user-data-dir={user_data}")
+
+    options.add_argument("--start-maximized")
+    options.add_argument("--no-first-run")
+    options.add_argument("--no-service-autorun")
+    options.add_argument("--password-store=basic")
+    options.add_argument("--lang=en-GB")
+    if proxy:
+        options.add_argument(f"--proxy-server={proxy}")
+
+    logger.debug("starting the browser")
+    return uc.Chrome(options=options, headless=headless)
+
+
+class PersistentSession(InterceptingSession, Session):
+    def __init__(
+        self,
+        session_file: Optional[Path] = None,
+        *args,
+        intercept: Literal["fetch", "network"] = "fetch",
+        resources: Optional[str] = None,
+        capture_dir: Optional[Path] = None,
+        **kwargs,
+    ):
+        self.session_file = session_file
+        # kept to start the same browser again in restart
+        self._args, self._kwargs = args, kwargs
+        self._intercept, self._resources = intercept, resources
+        # kept across restarts, a session is captured to a single archive
+        self._archive = SessionArchive(capture_dir) if capture_dir else None
+
+        # the state TinderBotz helpers keep on the session, its __init__ isn't
+        # run so that the browser can be started again on its own
+        self.email = None
+        self.may_send_email = False
+        self.session_data = {"duration": 0, "like": 0, "dislike": 0, "superlike": 0}
+        self.started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+
+        self.browser = start_browser(*args, **kwargs)
+        self._start_browser_hooks()
+
+    def _start_browser_hooks(self):
+        self.start_interception(self._intercept, self._archive)
+        if self._resources:
+            self.block_resources(self._resources)
+        install_dom_observer(self.browser)
+
+    def restart(self):
+        """
+        Replace the browser with a fresh one logged in with the saved
+        session data. The recommendations cache and its subscribers
+        are carried over, so whoever holds this session keeps working
+        """
+        self.save_session()
+        recs = self.recs
 
-    def login(self, auth_file: Path, auth_mode: Literal["phone", "facebook", "google"]):
-        self.browser.get("https://tinder.com/")
-        time.sleep(3)
+        self.stop_interception()
+        self.browser.quit()
+        self.browser = start_browser(*self._args, **self._kwargs)
+        self._start_browser_hooks()
 
-        if self._is_logged_in():
-            logger.debug("user already logged in")
-            return
+        recs.clear_deck()
+        self.recs = recs
 
-        # try to login with session data
-        # with open("session.json", "r") as f:
-        #     logger.debug("loading session data")
-        #     auth_session_data = json.loads(f.read())
-        #     self.set_local_storage(**auth_session_data["localStorage"])
-        #     self.set_indexed_db(**auth_session_data["db"])
+        self.restore_session()
+        self.browser.get("https://tinder.com/")
+        wait_for_app_ready(self.browser)
+        if not self._is_logged_in():
+            raise RuntimeError("login wasn't restored in the restarted browser")
 
-        time.sleep(3)
-        self.browser.refresh()
+    def login(self, auth_file: Path, auth_mode: Literal["phone", "facebook", "google"]):
+        # session data has to be in place before the app boots
+        restored = self.restore_session()
+
+        self.browser.get("https://tinder.com/")
+        wait_for_app_ready(self.browser)
 
         logger.debug(
             f"logged in with session data: {(logged_in := self._is_logged_in())}"
         )
         if logged_in:
+            if not restored:
+                # logged in from the browser profile, keep a snapshot for next time
+                self.save_session()
             return
 
         # try logging in manually
@@ -92,47 +135,106 @@ class PersistentSession(Session):
         logger.debug("logging in using " + auth_mode)
         auth_func(*auth_data)
 
-        # todo: save session after authorization
-        # self.save_session()
+        wait_for_app_ready(self.browser)
+        if self._is_logged_in():
+            self.save_session()
+
+    def _run_keyval(self, call: str, *args):
+        """
+        Run a function from the bundled keyvalStore.js and wait for its promise
+        """
+        script = (Path(__file__).parent / "keyvalStore.js").read_text()
+        result = self.browser.execute_async_script(
+            f"""
+            {script}
+            const done = arguments[arguments.length - 1];
+            {call}.then((result) => done({{result: result}}), (e) => done({{error: String(e)}}));
+            """,
+            *args,
+        )
+
+        if "error" in result:
+            raise RuntimeError(f"IndexedDB access failed: {result['error']}")
+        return result["result"]
 
     def set_local_storage(self, **kwargs):
-        for key, value in kwargs.items():
-            self.browser.execute_script(
-                "window.localStorage.setItem(arguments[0], arguments[1]);", key, value
-            )
+        self.browser.execute_script(
+            """
+            for (const [key, value] of Object.entries(arguments[0])) {
+                window.localStorage.setItem(key, value);
+            }
+            """,
+            kwargs,
+        )
 
     def set_indexed_db(self, **kwargs):
         """
         Connect to Tinder's storage in IndexedDB
         and set session data to reuse login
         """
-        sessionValues = "\n".join(
-            [
-                f"await server.keyval.put({{key: {json.dumps(key)}, item: {json.dumps(value)}}});"
-                for key, value in kwargs.items()
-            ]
-        )
-
-        script = f"""
-            (async () => {{
-            const onDbLoad = async () => {{
-                    const server = await db.open({{server: "keyval-store"}});
-                    {sessionValues}
-            }}
-
-            const script = document.createElement("script")
-            script.type = "text/javascript"
-            script.src = "https://rawcdn.githack.com/aaronpowell/db.js/11b4b071573e571389655927f8574b2b89723b04/dist/db.min.js"
-            script.addEventListener("load", onDbLoad)
-            document.getElementsByTagName("head")[0].appendChild(script);
-            }})();
-        """
-
-        self.browser.execute_script(script)
+        self._run_keyval("putKeyval(arguments[0])", kwargs)
 
     def save_session(self):
         """
         Dump session data from local storage
         to reuse when logging in
         """
-        raise NotImplementedError
+        if not self.session_file:
+            return
+
+        snapshot = {
+            "saved": time.time(),
+            "localStorage": self.browser.execute_script(
+                "return Object.assign({}, window.localStorage);"
+            ),
+            "db": self._run_keyval("dumpKeyval()"),
+        }
+        self.session_file.write_text(json.dumps(snapshot))
+        logger.debug(f"session saved to {self.session_file}")
+
+    def _is_session_valid(self, snapshot: dict) -> bool:
+        """
+        Check the stored API token with a single request
+        instead of booting the app to find out it expired
+        """
+        if not (token := snapshot["localStorage"].get(API_TOKEN_KEY)):
+            # can't tell without the token, let the app decide
+            return True
+
+        import requests
+
+        try:
+            r = requests.get(
+                "https://api.gotinder.com/v2/profile",
+                headers={"X-Auth-Token": token},
+                timeout=5,
+            )
+        except requests.RequestException as e:
+            logger.debug(f"couldn't validate stored session: {e}")
+            return True
+
+        return r.status_code != 401
+
+    def restore_session(self) -> bool:
+        """
+        Load session data saved by save_session into the browser
+        """
+        if not (self.session_file and self.session_file.exists()):
+            return False
+
+        logger.debug("loading session data")
+        try:
+            snapshot = json.loads(self.session_file.read_text())
+        except ValueError as e:
+            logger.error(f"failed to read session data: {e}")
+            return False
+
+        if not self._is_session_valid(snapshot):
+            logger.info("stored session has expired")
+            return False
+
+        # a lightweight page on tinder's origin gives access to its storage
+        self.browser.get("https://tinder.com/robots.txt")
+        self.set_local_storage(**snapshot["localStorage"])
+        self.set_indexed_db(**snapshot["db"])
+        return True
@@ -0,0 +1,104 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+from loguru import logger
+
+# folder inside the output folder the archives are written to
+ARCHIVE_FOLDER = "archives"
+ARCHIVE_SUFFIX = ".jsonl.gz"
+
+# the card stack, or whatever the page shows if the layout changed
+CARD_SNAPSHOT_SCRIPT = """
+const card = document.querySelector(".recsCardboard__cards")
+  || document.querySelector("main");
+return card ? card.outerHTML : null;
+"""
+
+
+class SessionArchive:
+    """
+    Append-only log of what a browser session received: recommendations
+    responses, swipe requests and snapshots of the card DOM, as gzipped
+    JSON lines. One archive is written per session.
+
+    Every record is flushed as it's written, so an archive cut short
+    by a crash loses at most the record that was being written
+    """
+
+    def __init__(self, folder: Path) -> None:
+        folder.mkdir(parents=True, exist_ok=True)
+        self.path = folder / (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{ARCHIVE_SUFFIX}"
+        )
+        self.records = 0
+
+        self._lock = threading.Lock()
+        self._file: Optional[gzip.GzipFile] = gzip.open(self.path, "ab")
+        # sessions aren't closed explicitly, the browser just quits
+        atexit.register(self.close)
+        logger.info(f"capturing the session to {self.path}")
+
+    def write(
+        self,
+        kind: str,
+        url: Optional[str] = None,
+        body: bytes | str | None = None,
+        **fields,
+    ):
+        record = {"kind": kind, "time": time.time(), "url": url, **fields}
+        if body is not None:
+            record["body"] = (
+                body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+            )
+        line = json.dumps(record).encode() + b"\n"
+
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            self._file.flush()
+            self.records += 1
+
+    def snapshot_card(self, browser, uuid: Optional[str] = None):
+        try:
+            html = browser.execute_script(CARD_SNAPSHOT_SCRIPT)
+        except Exception as e:
+            logger.warning(f"failed to snapshot the card: {e}")
+            return
+        if html:
+            self.write("card", url=browser.current_url, body=html, uuid=uuid)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_archive(path: Path) -> Iterator[dict]:
+    """
+    Iterate over the records of an archive, up to where it was cut short
+    """
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"skipping a malformed record in {path}")
+    except (EOFError, gzip.BadGzipFile) as e:
+        # archives of sessions that didn't exit cleanly have no gzip trailer
+        logger.debug(f"{path} ends early: {e}")
+
+
+def list_archives(folder: Path) -> list[Path]:
+    """
+    Archives in an output folder, oldest first
+    """
+    return sorted((folder / ARCHIVE_FOLDER).glob(f"*{ARCHIVE_SUFFIX}"))
@@ -1,16 +1,45 @@
+from __future__ import annotations
+
 import re
 from pathlib import Path
 
-import requests
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from loguru import logger
 
 from common import SwipeEvent
-from tinderbotz import Geomatch
+from downloader import ImageDownloader
+from image_pipeline import ImagePipeline
+from image_store import ImageStore
+from metrics import SWIPES
+from swipe_db import SwipeStore
+from timer import catchtime
+
+if TYPE_CHECKING:
+    from tinderbotz import Geomatch
+
+    from feature_cache import FeatureCache
+    from seen_index import SeenIndex
+
+
+def unwrap_image_url(url: str) -> Optional[str]:
+    # scraped urls come wrapped in css, the ones from the API are plain
+    if matched := re.match(r'url\("(.+)"\)', url):
+        return matched.group(1)
+    return url if url.startswith("http") else None
 
 
 class ProfileStore:
-    def __init__(self, folder: Path) -> None:
+    def __init__(
+        self,
+        folder: Path,
+        downloader: Optional[ImageDownloader] = None,
+        max_images: int = 1,
+        pipeline_workers: int = 2,
+    ) -> None:
+        # numpy is only loaded once a store is opened, not by importing the CLI
+        from feature_cache import FeatureCache
+        from seen_index import SeenIndex
+
         # init file for recording profile/image ids
 
         if folder.exists() and folder.is_file():
@@ -19,56 +48,141 @@ class ProfileStore:
         folder.mkdir(
             parents=True, exist_ok=True
         )  # create output folder if doesn't exist
-        self.outfile = folder / "out.txt"
-        self.outfile.touch()
+        self.folder = folder
+        self.swipes = SwipeStore(folder / "swipes.db")
+
+        # one-time import of swipes recorded in the legacy line format
+        if (outfile := folder / "out.txt").exists():
+            self.swipes.import_outfile(outfile)
+            outfile.rename(outfile.with_suffix(".txt.imported"))
+
+        self.seen = SeenIndex(folder / "seen.bloom")
+        self._sync_seen()
 
         # init folder for storing images
         (folder / "images").mkdir(exist_ok=True)
         self.image_folder = folder / "images"
-
-        self.last_entry_id = 0
-
-        # update last entry id if there is some data already
-        # with open(self.outfile, "r+") as f:
-        #     if len((lines := f.readlines()) and lines[-1]) > 0:
-        #         max_existing_id = int(lines[-1].split(":")[0])
-        #         self.last_entry_id = max_existing_id + 1
-
-    def save_profile(
-        self, uuid: str, action: str, image_urls: list[str], name: Optional[str]
-    ):
-        image_path = self.image_folder / f"{uuid}.jpg"
+        self.images = ImageStore(self.image_folder)
+        self.images.import_legacy()
+        self.features = FeatureCache(self.image_folder)
+        self.pipeline = ImagePipeline(self.images, workers=pipeline_workers)
+        self.max_images = max_images
+
+        self.downloader = downloader or ImageDownloader()
+
+    @property
+    def last_entry_id(self) -> int:
+        return self.swipes.last_entry_id
+
+    def _sync_seen(self):
+        # swipes recorded before the index existed, or by an older version
+        last_id = self.swipes.last_entry_id
+        if self.seen.full:
+            logger.info(f"seen index is over capacity, resizing for {2 * last_id}")
+            self.seen.clear(capacity=2 * last_id)
+        if self.seen.last_id < last_id:
+            added = self.seen.add_many(self.swipes.uuids(self.seen.last_id), last_id)
+            logger.info(f"added {added} recorded profiles to the seen index")
+
+    def is_recorded(self, uuid: str) -> bool:
+        # most profiles are new, the filter answers for them without a query
+        return uuid in self.seen and uuid in self.swipes
+
+    def store_images(self, uuid: str, image_urls: list[str]):
+        """
+        Link or download up to `max_images` images of a profile,
+        downloads happen in the background
+        """
+        position = 0
         for url in image_urls:
-            matched = re.match(r'url\("(.+)"\)', url)
-
-            if not matched:
+            if not (url := unwrap_image_url(url)):
                 continue
-            url = matched.group(1)
 
-            try:
-                r = requests.get(url)
-            except Exception as e:
-                logger.error(f"error getting an image from url: {url}")
-                logger.error(e)
-                continue
-            if not 200 <= r.status_code <= 299:
-                logger.error(f"got error code {r.status_code} for url: {url}")
+            if known := self.images.known_url(url):
+                logger.debug(f"image at {url} is already stored as {known}")
+                self.images.link(uuid, position, known)
+                if position == 0:
+                    self._cache_features(uuid, known, self.images.paths(uuid)[0])
+            else:
+
+                def store_image(content: bytes, position=position, url=url):
+                    hash = self.images.put(uuid, position, content, url=url)
+                    self.pipeline.submit(hash)
+                    if position == 0:
+                        self._cache_features(uuid, hash, content)
+
+                # image is fetched in the background, swipe handling doesn't wait for it
+                self.downloader.submit(url, store_image)
+
+            position += 1
+            if position >= self.max_images:
+                break
+
+    def main_image(self, uuid: Optional[str], image_urls: list[str]) -> Optional[bytes]:
+        """
+        Get the first image of a profile that can be had, from the store or
+        downloaded and stored right away so saving the swipe reuses it
+        """
+        for url in image_urls:
+            if not (url := unwrap_image_url(url)):
                 continue
 
-            # ext = os.path.splitext(url)[-1]
-            logger.debug(f"saving image to {image_path}")
+            if known := self.images.known_url(url):
+                try:
+                    return self.images.path(known, self.images.ext(known)).read_bytes()
+                except OSError as e:
+                    logger.warning(f"stored image {known} is unreadable: {e}")
 
-            with open(image_path, "wb") as f:
-                f.write(r.content)
-
-            # we only want to store one image
-            break
+            if (content := self.downloader.fetch(url)) is None:
+                continue
+            # scraped profiles have no uuid to store the image under
+            if uuid is not None:
+                self.pipeline.submit(self.images.put(uuid, 0, content, url=url))
+            return content
 
-        # record swipe for the profile
-        with open(self.outfile, "a") as profiles:
-            profiles.write(f"{uuid}:{name}:{action}\n")
+        return None
 
-        self.last_entry_id += 1
+    def save_profile(
+        self,
+        uuid: str,
+        action: str,
+        image_urls: list[str],
+        name: Optional[str],
+        timestamp: Optional[float] = None,
+    ):
+        with catchtime("saving profile", stage="save_profile"):
+            self.store_images(uuid, image_urls)
+
+            # record swipe for the profile
+            swipe_id = self.swipes.add(uuid, name, action, timestamp)
+            self.seen.add(uuid, swipe_id)
+        SWIPES.inc(action=getattr(action, "value", action))
+        logger.debug(f"image downloads: {self.downloader.stats}")
+
+    def skip_recorded(self, uuid: str, action: str):
+        """
+        A re-served profile was swiped again, its first swipe stays on record
+        """
+        logger.debug(f"not recording {getattr(action, 'value', action)} of {uuid}")
+
+    def _cache_features(self, uuid: str, hash: str, image: Path | bytes):
+        # features of the main image are what the learned matchmaker scores
+        try:
+            self.features.update(uuid, hash, image)
+        except OSError as e:
+            logger.warning(f"failed to compute features for {uuid}: {e}")
+
+    def close(self):
+        """
+        Wait for pending image downloads to finish
+        and commit outstanding swipe records
+        """
+        self.downloader.close()
+        self.pipeline.close()
+        self.features.close()
+        self.images.close()
+        self.seen.close()
+        self.swipes.close()
 
 
 def record_geomatch(
@@ -82,6 +196,12 @@ def record_geomatch(
         logger.error("Geomatch is missing name or images, skipping...")
         return False
 
+    # re-served profiles were swiped before, their images are stored already
+    if storage.is_recorded(event.profile_uuid):
+        logger.info(f"{geomatch.name} was recorded before, skipping")
+        storage.skip_recorded(event.profile_uuid, event.action)
+        return True
+
     # save profile image and record swipe action
     logger.info(f"Saving match record for {geomatch.name}")
     storage.save_profile(
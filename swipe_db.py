@@ -0,0 +1,254 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from loguru import logger
+
+
+class SwipeRecord(NamedTuple):
+    id: int
+    uuid: str
+    name: Optional[str]
+    action: str
+    timestamp: Optional[float]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS swipes (
+    id INTEGER PRIMARY KEY,
+    uuid TEXT NOT NULL,
+    name TEXT,
+    action TEXT NOT NULL,
+    timestamp REAL
+);
+CREATE INDEX IF NOT EXISTS swipes_uuid ON swipes (uuid);
+CREATE INDEX IF NOT EXISTS swipes_timestamp ON swipes (timestamp);
+CREATE INDEX IF NOT EXISTS swipes_action_timestamp ON swipes (action, timestamp);
+CREATE TABLE IF NOT EXISTS profiles (
+    uuid TEXT PRIMARY KEY,
+    name TEXT,
+    age INTEGER,
+    bio TEXT,
+    distance INTEGER,
+    image_urls TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+PROFILE_FIELDS = ("uuid", "name", "age", "bio", "distance", "image_urls")
+
+
+def _action_value(action) -> str:
+    # SwipeAction members are stored by their value
+    return getattr(action, "value", action)
+
+
+class SwipeStore:
+    """
+    SQLite backed swipe log, indexed by profile uuid, time and action.
+
+    Inserts are committed in batches of `batch_size` records or once
+    `batch_interval` seconds passed since the last commit, whichever comes first.
+    """
+
+    def __init__(
+        self, path: Path, batch_size: int = 1, batch_interval: float = 5
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    @property
+    def last_entry_id(self) -> int:
+        with self._lock:
+            (last_id,) = self._db.execute("SELECT MAX(id) FROM swipes").fetchone()
+        return last_id or 0
+
+    def add(
+        self,
+        uuid: str,
+        name: Optional[str],
+        action: str,
+        timestamp: Optional[float] = None,
+    ) -> int:
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO swipes (uuid, name, action, timestamp) VALUES (?, ?, ?, ?)",
+                (uuid, name, _action_value(action), timestamp),
+            )
+            self._uncommitted += 1
+
+            if (
+                self._uncommitted >= self.batch_size
+                or time.monotonic() - self._last_commit >= self.batch_interval
+            ):
+                self._commit()
+
+        return cursor.lastrowid
+
+    def _commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    def get(self, uuid: str) -> Optional[SwipeRecord]:
+        """
+        Get the latest swipe recorded for a profile
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, uuid, name, action, timestamp FROM swipes "
+                "WHERE uuid = ? ORDER BY id DESC LIMIT 1",
+                (uuid,),
+            ).fetchone()
+        return SwipeRecord(*row) if row else None
+
+    def __contains__(self, uuid: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM swipes WHERE uuid = ? LIMIT 1", (uuid,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM swipes").fetchone()
+        return count
+
+    def query(
+        self,
+        *,
+        action: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Iterator[SwipeRecord]:
+        """
+        Iterate over swipes, optionally filtered by action and
+        a [since, until) timestamp range, in the order they were recorded
+        """
+        conditions, params = [], []
+        if action is not None:
+            conditions.append("action = ?")
+            params.append(_action_value(action))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, uuid, name, action, timestamp FROM swipes {where} ORDER BY id",
+                params,
+            ).fetchall()
+
+        for row in rows:
+            yield SwipeRecord(*row)
+
+    def uuids(self, after_id: int = 0) -> list[str]:
+        """
+        Get profile uuids of the swipes recorded after `after_id`
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT uuid FROM swipes WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+        return [uuid for (uuid,) in rows]
+
+    def put_profiles(self, profiles: Iterable[dict]) -> int:
+        """
+        Insert or update profile details beyond what a swipe record holds,
+        as parsed from captured sessions. Details missing from a profile
+        keep the values stored before
+        """
+        rows = [
+            (
+                *(profile.get(field) for field in PROFILE_FIELDS[:-1]),
+                json.dumps(profile.get("image_urls") or []),
+                time.time(),
+            )
+            for profile in profiles
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO profiles "
+                "(uuid, name, age, bio, distance, image_urls, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(uuid) DO UPDATE SET "
+                "name = COALESCE(excluded.name, name), "
+                "age = COALESCE(excluded.age, age), "
+                "bio = COALESCE(excluded.bio, bio), "
+                "distance = COALESCE(excluded.distance, distance), "
+                "image_urls = COALESCE(NULLIF(excluded.image_urls, '[]'), image_urls), "
+                "updated = excluded.updated",
+                rows,
+            )
+            self._commit()
+        return len(rows)
+
+    def profile(self, uuid: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(PROFILE_FIELDS)} FROM profiles WHERE uuid = ?",
+                (uuid,),
+            ).fetchone()
+        if not row:
+            return None
+        profile = dict(zip(PROFILE_FIELDS, row))
+        profile["image_urls"] = json.loads(profile["image_urls"])
+        return profile
+
+    def import_outfile(self, outfile: Path) -> int:
+        """
+        Import swipes from the legacy `uuid:name:action` out.txt format.
+        Imported records have no timestamp
+        """
+        records = []
+        with open(outfile) as f:
+            for line in f:
+                if not (line := line.rstrip("\n")):
+                    continue
+
+                uuid, _, rest = line.partition(":")
+                name, _, action = rest.rpartition(":")
+                if not (uuid and action):
+                    logger.warning(f"skipping malformed swipe record: {line}")
+                    continue
+
+                records.append((uuid, None if name == "None" else name, action))
+
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO swipes (uuid, name, action) VALUES (?, ?, ?)", records
+            )
+            self._commit()
+
+        logger.info(f"imported {len(records)} swipes from {outfile}")
+        return len(records)
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._db.close()
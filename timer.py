@@ -1,13 +1,23 @@
 # src: https://stackoverflow.com/questions/33987060/python-context-manager-that-measures-time
 
 from time import perf_counter
+from typing import Optional
 
 from loguru import logger
 
+from metrics import STAGE_SECONDS
+
 
 class catchtime:
-    def __init__(self, message: str) -> None:
+    """
+    Time a block and log it, with a `stage` the time is also
+    recorded in the stage latency histogram under the given labels
+    """
+
+    def __init__(self, message: str, stage: Optional[str] = None, **labels) -> None:
         self.msg = message
+        self.stage = stage
+        self.labels = labels
 
     def __enter__(self):
         self.start = perf_counter()
@@ -15,6 +25,8 @@ class catchtime:
 
     def __exit__(self, type, value, traceback):
         self.time = perf_counter() - self.start
+        if self.stage:
+            STAGE_SECONDS.observe(self.time, stage=self.stage, **self.labels)
 
         self.readout = f"{self.msg} took: {self.time:.3f} seconds"
         logger.debug(self.readout)
@@ -1,23 +1,36 @@
-import abc
+from __future__ import annotations
+
 import argparse
 import sys
-import random
+import threading
 import time
-from typing import Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
 from pathlib import Path
 import os
 
 from loguru import logger
-from common import SwipeAction
+from common import SwipeAction, SwipeEvent
 
+from capture import SwipeCapture, card_key
 from events import catch_swipe_by_network_request
-from session import PersistentSession
+from governor import RateGovernor
+from matchmaker import Matchmaker, RandomMatchmaker
+from memory_watchdog import MemoryWatchdog, add_watchdog_arguments, watchdog_from_args
+from metrics import UNCONFIRMED_SWIPES, MetricsReporter
+from readiness import dom_version, wait_for_next_card
+from resources import RESOURCE_PRESETS
+from session_archive import ARCHIVE_FOLDER
 from storage import ProfileStore, record_geomatch
 
 from timer import catchtime
-from tinderbotz.helpers.geomatch import Geomatch
-from tinderbotz.helpers.geomatch_helper import GeomatchHelper
-from tinderbotz.session import Session
+
+# selenium and tinderbotz are only imported once a browser session is started
+if TYPE_CHECKING:
+    from session import PersistentSession
+    from tinderbotz.helpers.geomatch import Geomatch
+    from tinderbotz.session import Session
 
 
 logger.remove()
@@ -25,168 +38,408 @@ logger.remove()
 
 AUTH_FILE = "auth.txt"
 USER_SESSION_FILE = ".session.json"
+MATCHMAKER_FILE = "matchmaker.npz"
 
-parser = argparse.ArgumentParser(
-    prog="tinder_auto",
-    description="What the program does",
-)
-parser.add_argument(
-    "mode",
-    choices=["training", "auto"],
-    help="script running mode. if training is selected, script "
-    "will launch tinder session and wait to receive swipe input. "
-    "currently only programmatic input is supported (i.e. via Selenium send_keys) "
-    "if no action is supplied for a --timeout, script will exit",
-)
-parser.add_argument(
-    "--debug",
-    action="store_const",
-    const="DEBUG",
-    default="INFO",
-    dest="log_level",
-    help="set logging level to DEBUG",
-)
-parser.add_argument(
-    "--auth_type",
-    choices=["phone", "facebook", "google"],
-    required=True,
-    help="which login method to use",
-)
-parser.add_argument(
-    "--auth_file",
-    type=Path,
-    default=AUTH_FILE,
-    metavar="FILEPATH",
-    help="path to file with the auth credentials separeted by semicolon (:)",
-)
-parser.add_argument(
-    "--out",
-    type=Path,
-    default="output",
-    help="folder where to output swipe data",
-    metavar="PATH",
-)
-parser.add_argument(
-    "--timeout",
-    type=int,
-    default=300,
-    help="how many seconds to wait for a user input action when in training mode",
-    metavar="SECONDS",
-)
-
-
-class Matchmaker(abc.ABC):
-    @abc.abstractmethod
-    def decide(self, profile: Geomatch) -> SwipeAction:
-        pass
-
-
-class RandomMatchmaker(Matchmaker):
-    def __init__(self, ratio: int) -> None:
-        super().__init__()
-
-        if not 0 < ratio < 100:
-            raise ValueError("ratio must be between 1 and 99%")
-
-        self.threshold = ratio / 100
-
-    def decide(self, *args, **kwargs):
-        if random.random() < self.threshold:
-            return SwipeAction.Like
-        else:
-            return SwipeAction.Dislike
 
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="tinder_auto",
+        description="What the program does",
+    )
+    parser.add_argument(
+        "mode",
+        choices=["training", "auto"],
+        help="script running mode. if training is selected, script "
+        "will launch tinder session and wait to receive swipe input. "
+        "currently only programmatic input is supported (i.e. via Selenium send_keys) "
+        "if no action is supplied for a --timeout, script will exit",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_const",
+        const="DEBUG",
+        default="INFO",
+        dest="log_level",
+        help="set logging level to DEBUG",
+    )
+    parser.add_argument(
+        "--auth_type",
+        choices=["phone", "facebook", "google"],
+        required=True,
+        help="which login method to use",
+    )
+    parser.add_argument(
+        "--auth_file",
+        type=Path,
+        default=AUTH_FILE,
+        metavar="FILEPATH",
+        help="path to file with the auth credentials separeted by semicolon (:)",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default="output",
+        help="folder where to output swipe data",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--intercept",
+        choices=["fetch", "network"],
+        default="fetch",
+        help="how swipe requests are caught: 'fetch' has the browser pause only "
+        "swipe requests, 'network' receives every request of the page",
+    )
+    parser.add_argument(
+        "--block_resources",
+        choices=list(RESOURCE_PRESETS),
+        default=None,
+        help="requests the browser drops: 'training' blocks trackers, 'auto' also "
+        "fonts, media and card photos. defaults to the preset of the mode",
+        metavar="PRESET",
+    )
+    parser.add_argument(
+        "--capture",
+        action="store_true",
+        help="keep recommendations, swipe requests and card snapshots in "
+        "compressed archives in --out, to be reprocessed with python -m replay",
+    )
+    parser.add_argument(
+        "--n_profiles",
+        type=int,
+        default=None,
+        help="auto mode: stop after swiping this many profiles",
+        metavar="N",
+    )
+    parser.add_argument(
+        "--max_runtime",
+        type=int,
+        default=15,
+        help="auto mode: stop after this many minutes",
+        metavar="MINUTES",
+    )
+    parser.add_argument(
+        "--swipes_per_minute",
+        type=float,
+        default=20,
+        help="auto mode: average swipe rate limit, 0 to swipe as fast as possible",
+        metavar="N",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.3,
+        help="auto mode: random shift of each pause between swipes, "
+        "as a fraction of the average pause",
+        metavar="FRACTION",
+    )
+    add_watchdog_arguments(parser)
+    parser.add_argument(
+        "--matchmaker",
+        choices=["random", "learned"],
+        default="random",
+        help="auto mode: how swiping decisions are made. 'learned' trains "
+        "on the swipes recorded in --out during training mode",
+    )
+    parser.add_argument(
+        "--accounts",
+        type=Path,
+        default=None,
+        metavar="FILEPATH",
+        help="auto mode: file with one '[auth_type] [auth_file]' line per account, "
+        "each account is swiped in its own browser process",
+    )
+    parser.add_argument(
+        "--worker_profiles",
+        type=int,
+        default=None,
+        help="auto mode with --accounts: maximum number of profiles per account",
+        metavar="N",
+    )
+    parser.add_argument(
+        "--profiles_dir",
+        type=Path,
+        default=".profiles",
+        help="auto mode with --accounts: folder for per-account browser profiles",
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--metrics_interval",
+        type=float,
+        default=60,
+        help="log a summary of stage latencies every this many seconds, 0 to disable",
+        metavar="SECONDS",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        default=300,
+        help="how many seconds to wait for a user input action when in training mode",
+        metavar="SECONDS",
+    )
+    return parser
 
-def get_geomatch(session: Session) -> Geomatch:
-    with catchtime("parsing profile"):
-        geomatch: Optional[Geomatch] = session.get_geomatch(quickload=True)
 
+def get_geomatch(session: PersistentSession) -> Geomatch:
+    # profiles from the recommendations API are already parsed,
+    # scraping the card is only a fallback
+    with catchtime("getting profile", stage="get_geomatch") as timer:
+        if (geomatch := session.recs.current()) is not None:
+            logger.debug(f"got {geomatch} from recommendations")
+            timer.labels["source"] = "recs"
+        else:
+            timer.labels["source"] = "dom"
+            geomatch: Optional[Geomatch] = session.get_geomatch(quickload=True)
+
+    if archive := getattr(session, "archive", None):
+        archive.snapshot_card(session.browser, getattr(geomatch, "uuid", None))
+
+    if not geomatch or not (geomatch.name and geomatch.image_urls):
+        raise ValueError("geomatch doesn't have name or images")
     logger.info(
         f"Profile data parsed for {geomatch.name}, got {len(geomatch.image_urls)} image urls"
     )
-    if not geomatch or not (geomatch.name and geomatch.image_urls):
-        raise ValueError("geomatch doesn't have name or images")
 
     return geomatch
 
 
+def get_next_geomatch(
+    session: Session, previous: Geomatch, since: int, timeout: float = 10
+) -> Geomatch:
+    """
+    Parse the card that replaced `previous` on the screen as soon as it's rendered,
+    `since` is the DOM version taken before swiping
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        wait_for_next_card(
+            session.browser, since, timeout=max(deadline - time.monotonic(), 0)
+        )
+        since = dom_version(session.browser)
+
+        try:
+            geomatch = get_geomatch(session)
+            if geomatch.image_urls != previous.image_urls:
+                return geomatch
+        except ValueError as e:
+            if time.monotonic() > deadline:
+                raise
+            logger.debug(f"next card is not ready yet: {e}")
+        else:
+            if time.monotonic() > deadline:
+                logger.warning("card didn't change after swipe")
+                return geomatch
+
+
+def record_swipe(session, storage, geomatch: Geomatch, timeout: float) -> SwipeEvent:
+    """
+    Wait for the swipe request of a clicked card and record it
+    """
+    event = catch_swipe_by_network_request(session, timeout)
+
+    # the swiped profile is identified by the uuid from the network request
+    if getattr(geomatch, "uuid", event.profile_uuid) != event.profile_uuid:
+        logger.warning(f"swiped {event.profile_uuid}, expected {geomatch.uuid}")
+        geomatch = session.recs.get(event.profile_uuid)
+
+    if not record_geomatch(storage, event, geomatch=geomatch):
+        # the browser sent the swipe all the same, it's kept without the profile
+        if storage.is_recorded(event.profile_uuid):
+            storage.skip_recorded(event.profile_uuid, event.action)
+        else:
+            storage.save_profile(event.profile_uuid, event.action, [], None)
+    return event
+
+
+def confirm_swipe(recorded: Future):
+    """
+    Wait for a swipe to be recorded. A swipe that wasn't doesn't stop
+    the run, the next card is swiped and recorded on its own
+    """
+    try:
+        recorded.result()
+    except TimeoutError as e:
+        # an out-of-likes paywall, or a click that didn't register
+        logger.error(f"swipe wasn't confirmed: {e}")
+        UNCONFIRMED_SWIPES.inc(reason="timeout")
+    except Exception as e:
+        logger.exception(f"failed to record a swipe: {e}")
+        UNCONFIRMED_SWIPES.inc(reason="error")
+
+
+def swipe_click(helper, action: SwipeAction):
+    with catchtime(f"{action.value} click", stage="helper_swipe", action=action.value):
+        match action:
+            case SwipeAction.Superlike:
+                # todo: handle out of superlikes
+                helper.superlike()
+            case SwipeAction.Like:
+                helper.like()
+            case SwipeAction.Dislike:
+                helper.dislike()
+        # i wanted to do "getattr(helper, action.value)()" but its probably too unreadable :P
+
+
 class Trainer:
     def __init__(
-        self, *, session: Session, storage: ProfileStore, idle_timeout: int = 300
+        self,
+        *,
+        session: Session,
+        storage: ProfileStore,
+        idle_timeout: int = 300,
+        prefetch: bool = False,
+        watchdog: Optional[MemoryWatchdog] = None,
     ) -> None:
         self.session = session
         self.storage = storage
         self.idle_timeout = idle_timeout
+        self.watchdog = watchdog
+
+        from tinderbotz.helpers.geomatch_helper import GeomatchHelper
 
         self.helper = GeomatchHelper(browser=session.browser)
         self.match = None
 
+        # in prefetch mode swipes are confirmed and recorded in the background
+        # while the next card is parsed
+        self.prefetch = prefetch
+        self.recorder = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    def _record_swipe(self, geomatch: Geomatch):
+        return record_swipe(self.session, self.storage, geomatch, self.idle_timeout)
+
     def next(self, action: SwipeAction | None):
         logger.debug(f"[SCRIPT] process pid: {os.getpid()}, parent pid: {os.getppid()}")
         logger.info("getting geomatch")
 
-        match action:
-            case SwipeAction.Like:
-                self.helper.like()
-            case SwipeAction.Dislike:
-                self.helper.dislike()
-            case _:
-                pass
-
+        before_swipe = dom_version(self.session.browser)
         if action is not None:
-            event = catch_swipe_by_network_request(self.session, self.idle_timeout)
+            swipe_click(self.helper, action)
 
-            # store swipe and profile data
-            record_geomatch(
-                storage,
-                event,
-                geomatch=self.match,
+        if action is not None and self.prefetch:
+            swiped = self.match
+            recorded = self.recorder.submit(self._record_swipe, swiped)
+
+            # the next card is known upfront if the profiles came from the API
+            self.match = self.session.recs.next_after(swiped) or get_next_geomatch(
+                self.session, swiped, before_swipe
             )
+            # wait until the swipe is confirmed by Tinder API
+            recorded.result(timeout=self.idle_timeout)
+        elif action is not None:
+            self._record_swipe(self.match)
 
             # let the page update after swipe before parsing next match
-            time.sleep(2)
+            wait_for_next_card(self.session.browser, before_swipe)
             self.match = get_geomatch(self.session)
         elif not self.match:
             self.match = get_geomatch(self.session)
 
+        if action is not None and self.watchdog:
+            if reason := self.watchdog.check(self.session.browser):
+                self.watchdog.recycle(self.session, reason)
+                # helpers click through the browser they were made with
+                self.helper.browser = self.session.browser
+                self.match = get_geomatch(self.session)
+
         yield self.match
 
 
 def launch_training(storage, session, idle_timeout):
-    """"""
-    # loop until exited or times out
-    while True:
-        logger.debug(f"[SCRIPT] process pid: {os.getpid()}, parent pid: {os.getppid()}")
-        logger.info("getting geomatch")
-        try:
-            geomatch = get_geomatch(session)
-        except ValueError as e:
-            logger.error(f"failed to get geomatch info: {e}")
-            input("press enter to continue")
-            continue
+    """
+    Record swipes made by the user in the browser. Cards are parsed
+    as they appear and swipes are caught from the network in parallel,
+    the two streams are joined by SwipeCapture so no swipe is lost
+    """
+
+    def record_swipe(event: SwipeEvent, geomatch: Optional[Geomatch]):
+        # store swipe and profile data, the swipe is kept even without the profile
+        if not record_geomatch(storage, event, geomatch=geomatch):
+            storage.save_profile(event.profile_uuid, event.action, [], None)
 
+    capture = SwipeCapture(record_swipe)
+    # profiles from the recommendations API are joined with swipes by uuid
+    session.recs.subscribe(lambda profile: capture.add_profile(profile, profile.uuid))
+    idle = threading.Event()
+    swiped = threading.Event()
+
+    def catch_swipes():
         # wait for the user action to happen, and get the action type (like/dislike/superlike)
         logger.info("waiting for swipe event")
-        # action = catch_swipe_by_js_events(session, idle_timeout)
-        event = catch_swipe_by_network_request(session, idle_timeout)
-
-        # store swipe and profile data
-        record_geomatch(
-            storage,
-            event,
-            geomatch=geomatch,
-        )
+        try:
+            while True:
+                # action = catch_swipe_by_js_events(session, idle_timeout)
+                capture.add_event(catch_swipe_by_network_request(session, idle_timeout))
+                swiped.set()
+        except TimeoutError as e:
+            logger.info(f"{e}, stopping")
+            idle.set()
+            swiped.set()
+
+    threading.Thread(target=catch_swipes, name="swipe-catcher", daemon=True).start()
 
-        # let the page update after swipe before parsing next match
-        time.sleep(2)
+    # loop until exited or times out
+    previous_card = None
+    try:
+        while not idle.is_set():
+            logger.debug(
+                f"[SCRIPT] process pid: {os.getpid()}, parent pid: {os.getppid()}"
+            )
+            logger.info("getting geomatch")
+            before_swipe = dom_version(session.browser)
+            shown = time.monotonic()
+            try:
+                geomatch = get_geomatch(session)
+            except ValueError as e:
+                logger.error(f"failed to get geomatch info: {e}")
+                input("press enter to continue")
+                continue
+
+            # cards known from the API are already in the capture, scraped ones
+            # are paired with the swipes made after they were shown
+            if getattr(geomatch, "uuid", None) is None:
+                card = card_key(geomatch)
+                if card is None or card != previous_card:
+                    capture.add_profile(geomatch, shown=shown)
+                previous_card = card
+
+            # the user takes as long as they like, the card only
+            # changes after a swipe, then let the page update
+            swiped.wait()
+            swiped.clear()
+            if not idle.is_set():
+                wait_for_next_card(session.browser, before_swipe)
+    finally:
+        capture.close()
 
 
 def run_auto(
-    session, storage, max_runtime: Optional[int] = 15, n_profiles: Optional[int] = None
+    session,
+    storage,
+    max_runtime: Optional[int] = 15,
+    n_profiles: Optional[int] = None,
+    *,
+    matchmaker: Optional[Matchmaker] = None,
+    stop: Optional[threading.Event] = None,
+    swipe_timeout: int = 30,
+    helper=None,
+    swipes_per_minute: Optional[float] = None,
+    jitter: float = 0.3,
+    max_unrecorded: int = 2,
+    watchdog: Optional[MemoryWatchdog] = None,
 ):
     """
     max_runtime: int = default 15, amount of time in minutes for which
                        the agent is allowed ro run.
+    stop: event = optional, set by another thread or process to stop swiping
+    helper = optional, clicks the like/dislike/superlike buttons,
+             a TinderBotz GeomatchHelper by default
+    swipes_per_minute: float = optional, average swipe rate limit
+    jitter: float = default 0.3, random shift of each pause between swipes,
+                    as a fraction of the average pause
+    max_unrecorded: int = default 2, swipes allowed to wait for their network
+                          request before the next card is swiped
+    watchdog: MemoryWatchdog = optional, restarts the browser
+                               when it grows too big
     """
     if n_profiles:
         logger.info(
@@ -207,54 +460,228 @@ def run_auto(
                         more than 2 hours?"
         )
 
-    profiles_swiped = 0
-    while (n_profiles and (profiles_swiped <= n_profiles)) or (
-        max_runtime and True
-    ):  # todo: update to check conditions above
-        geomatch = get_geomatch(session)
+    matchmaker = matchmaker or RandomMatchmaker(ratio=70)
+    if helper is None:
+        from tinderbotz.helpers.geomatch_helper import GeomatchHelper
 
-        action: SwipeAction = RandomMatchmaker(ratio=70).decide(geomatch)
         helper = GeomatchHelper(browser=session.browser)
 
-        match action:
-            case SwipeAction.Superlike:
-                # todo: handle out of superlikes
-                helper.superlike()
-            case SwipeAction.Like:
-                helper.like()
-            case SwipeAction.Dislike:
-                helper.dislike()
-        # i wanted to do "getattr(helper, action.value)()" but its probably too unreadable :P
-
-        profiles_swiped += 1
-        # todo: save profile
-
-        # todo: sleep for random amount of time
-
+    governor = (
+        RateGovernor(swipes_per_minute, jitter=jitter) if swipes_per_minute else None
+    )
 
-def init(out: Path, log_level: str = "INFO", session_kwargs: dict | None = None):
-    if not session_kwargs:
-        session_kwargs = {}
+    started = time.monotonic()
+    deadline = started + max_runtime * 60 if max_runtime else None
+
+    # the matchmaker runs ahead on the upcoming cards while the swipes
+    # of the previous cards are confirmed and recorded behind
+    decider = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auto-decider")
+    recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auto-recorder")
+    # decisions are made for the whole deck at once, whenever it's refilled
+    decisions: dict[str, tuple[Future, int]] = {}
+    recording: deque[Future] = deque()
+
+    def decide_upcoming():
+        # re-served profiles aren't scored, nor their images downloaded for it
+        if not (
+            upcoming := [
+                p
+                for p in session.recs.upcoming()
+                if p.uuid not in decisions and not storage.is_recorded(p.uuid)
+            ]
+        ):
+            return
+        batch = decider.submit(matchmaker.decide_batch, upcoming)
+        for index, profile in enumerate(upcoming):
+            decisions[profile.uuid] = (batch, index)
 
+    profiles_swiped = 0
+    try:
+        while (
+            (not n_profiles or profiles_swiped < n_profiles)
+            and (not deadline or time.monotonic() < deadline)
+            and not (stop and stop.is_set())
+        ):
+            before_swipe = dom_version(session.browser)
+            try:
+                geomatch = get_geomatch(session)
+            except ValueError as e:
+                logger.error(f"failed to get geomatch info: {e}")
+                wait_for_next_card(session.browser, before_swipe)
+                continue
+
+            decide_upcoming()
+            uuid = getattr(geomatch, "uuid", None)
+            if decision := decisions.pop(uuid, None):
+                batch, index = decision
+                action: SwipeAction = batch.result()[index]
+            elif uuid is not None and storage.is_recorded(uuid):
+                # re-served profile, swiped the same way as the first time
+                action = SwipeAction(storage.swipes.get(uuid).action)
+                logger.info(f"{geomatch.name} was swiped before, {action.value} again")
+            else:
+                action = matchmaker.decide(geomatch)
+
+            if governor and not governor.acquire(deadline=deadline, stop=stop):
+                break
+
+            swipe_click(helper, action)
+            profiles_swiped += 1
+            recording.append(
+                recorder.submit(record_swipe, session, storage, geomatch, swipe_timeout)
+            )
+            # a swipe still unconfirmed a couple of cards later means trouble
+            while len(recording) > max_unrecorded:
+                confirm_swipe(recording.popleft())
+
+            wait_for_next_card(session.browser, before_swipe)
+
+            if watchdog and (reason := watchdog.check(session.browser)):
+                # swipes made on the old page are confirmed before it's gone
+                while recording:
+                    confirm_swipe(recording.popleft())
+                decisions.clear()
+
+                watchdog.recycle(session, reason)
+                helper.browser = session.browser
+    finally:
+        decider.shutdown(cancel_futures=True)
+        for future in recording:
+            confirm_swipe(future)
+        recorder.shutdown()
+
+    minutes = (time.monotonic() - started) / 60
+    logger.info(
+        f"swiped {profiles_swiped} profiles in {minutes:.1f} minutes "
+        f"({profiles_swiped / max(minutes, 1e-6):.1f} profiles/minute)"
+    )
+    return profiles_swiped
+
+
+def load_matchmaker(kind: str, storage: ProfileStore) -> Matchmaker:
+    if kind == "random":
+        return RandomMatchmaker(ratio=70)
+
+    # numpy and the model are only loaded when needed
+    from learned_matchmaker import LearnedMatchmaker, stored_image_loader
+
+    # scored images are stored, the swipe doesn't download them again
+    image_loader = stored_image_loader(storage)
+
+    # the saved model is reused until new swipes are recorded
+    model_file = storage.folder / MATCHMAKER_FILE
+    if model_file.exists():
+        matchmaker = LearnedMatchmaker.load(model_file, image_loader=image_loader)
+        if matchmaker.trained_on == storage.last_entry_id:
+            return matchmaker
+
+    matchmaker = LearnedMatchmaker.train(storage, image_loader=image_loader)
+    matchmaker.save(model_file)
+    return matchmaker
+
+
+def start_session(
+    auth_file: Path,
+    auth_type: str,
+    session_kwargs: dict | None = None,
+    session_file: Path = Path(USER_SESSION_FILE),
+) -> PersistentSession:
+    from session import PersistentSession
+
+    with catchtime("cold start to logged in session"):
+        # launch selenium driver, try to login with stored sesssion if exists, otherwise use user credentials
+        session = PersistentSession(session_file=session_file, **(session_kwargs or {}))
+        while not session._is_logged_in():
+            session.login(auth_file=auth_file, auth_mode=auth_type)
+    return session
+
+
+def init(
+    out: Path,
+    log_level: str = "INFO",
+    session_kwargs: dict | None = None,
+    *,
+    auth_file: Path = Path(AUTH_FILE),
+    auth_type: str = "phone",
+):
     logger.add(sys.stderr, level=log_level)
     storage = ProfileStore(out)
-    # launch selenium driver, try to login with stored sesssion if exists, otherwise use user credentials
-    session = PersistentSession(session_file=Path(USER_SESSION_FILE), **session_kwargs)
-    while not session._is_logged_in():
-        session.login(auth_file=args.auth_file, auth_mode=args.auth_type)
+    session = start_session(auth_file, auth_type, session_kwargs)
     return storage, session
 
 
 if __name__ == "__main__":
-    args = parser.parse_args()
-
-    storage, session = init(out=args.out, log_level=args.log_level)
+    args = build_parser().parse_args()
+    session_kwargs = {
+        "intercept": args.intercept,
+        "resources": args.block_resources or args.mode,
+        "capture_dir": args.out / ARCHIVE_FOLDER if args.capture else None,
+    }
+    # auto mode browsers are restarted once they grow too big
+    watchdog = watchdog_from_args(args)
+
+    if args.mode == "auto" and args.accounts:
+        from pool import SessionPool, read_accounts
+
+        logger.add(sys.stderr, level=args.log_level)
+        storage = ProfileStore(args.out)
+
+        matchmaker_file = None
+        if args.matchmaker == "learned":
+            # trained once here, the workers load the saved model
+            load_matchmaker(args.matchmaker, storage)
+            matchmaker_file = storage.folder / MATCHMAKER_FILE
 
-    if args.mode == "training":
-        launch_training(
-            session=session,
-            storage=storage,
-            idle_timeout=args.timeout,
-        )
-    elif args.mode == "auto":
-        raise NotImplementedError
+        try:
+            SessionPool(
+                read_accounts(args.accounts),
+                storage,
+                profiles_dir=args.profiles_dir,
+                n_profiles=args.n_profiles,
+                worker_profiles=args.worker_profiles,
+                max_runtime=args.max_runtime,
+                log_level=args.log_level,
+                session_kwargs=session_kwargs,
+                matchmaker_file=matchmaker_file,
+                auto_kwargs={
+                    "swipes_per_minute": args.swipes_per_minute,
+                    "jitter": args.jitter,
+                    "watchdog": watchdog,
+                },
+            ).run()
+        finally:
+            storage.close()
+        sys.exit()
+
+    storage, session = init(
+        out=args.out,
+        log_level=args.log_level,
+        session_kwargs=session_kwargs,
+        auth_file=args.auth_file,
+        auth_type=args.auth_type,
+    )
+    reporter = MetricsReporter(args.metrics_interval) if args.metrics_interval else None
+
+    try:
+        if args.mode == "training":
+            launch_training(
+                session=session,
+                storage=storage,
+                idle_timeout=args.timeout,
+            )
+        elif args.mode == "auto":
+            run_auto(
+                session,
+                storage,
+                max_runtime=args.max_runtime,
+                n_profiles=args.n_profiles,
+                matchmaker=load_matchmaker(args.matchmaker, storage),
+                swipes_per_minute=args.swipes_per_minute,
+                jitter=args.jitter,
+                watchdog=watchdog,
+            )
+    finally:
+        # let the queued image downloads finish before exiting
+        storage.close()
+        if reporter:
+            reporter.close()
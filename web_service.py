@@ -1,31 +1,102 @@
-from pathlib import Path
+import argparse
+import asyncio
 import time
+from pathlib import Path
 from fastapi.concurrency import asynccontextmanager
-from fastapi.responses import HTMLResponse
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+)
 from jinja2 import Environment, PackageLoader, select_autoescape
+from loguru import logger
+from browser_worker import BrowserBusy, BrowserWorker
 from common import SwipeAction
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.templating import Jinja2Templates
 
+from image_pipeline import THUMBNAIL
+from memory_watchdog import MemoryWatchdog, add_watchdog_arguments, watchdog_from_args
+from metrics import REGISTRY, STAGE_SECONDS, MetricsReporter
+from profile_cache import ProfileCache, ProfileRecord
+from storage import unwrap_image_url
+from timer import catchtime
 from tinder_auto import Trainer, init
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # instantiate a global async httpx client to be used by all requests
-    # will be automatically closed upon the app shutting down
+# seconds to wait for a browser command before giving up on the request
+COMMAND_TIMEOUT = 60
+# profiles after the current one sent to the UI, so their images are preloaded
+PRELOAD_PROFILES = 3
+# images of a profile don't change, but they aren't content addressed by url
+IMAGE_CACHE_CONTROL = "private, max-age=86400"
+# seconds between metrics summaries in the log
+METRICS_INTERVAL = 60
+
+
+def start_trainer(watchdog: MemoryWatchdog):
     storage, session = init(
         out=Path("output"),
         # session_kwargs={"headless": True}
     )
-    app.trainer: Trainer = Trainer(storage=storage, session=session)
+    return Trainer(storage=storage, session=session, prefetch=True, watchdog=watchdog)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the browser is created and driven only by the worker thread
+    app.browser = BrowserWorker()
+    # swiping in the UI can go on for hours, the browser is restarted as it
+    # grows, within the limits given on the command line or the default ones
+    watchdog = getattr(app, "watchdog", None) or MemoryWatchdog()
+    app.trainer: Trainer = await app.browser.run("start", start_trainer, watchdog)
+
+    app.sockets: set[WebSocket] = set()
+    app.prefetched: set[str] = set()
+    app.push_scheduled = False
+    # recently shown profiles, served without going to the browser
+    app.profiles = ProfileCache()
+    app.reporter = MetricsReporter(METRICS_INTERVAL)
+
+    # new recommendations are pushed to the UI as soon as they are parsed
+    loop = asyncio.get_running_loop()
+    app.trainer.session.recs.subscribe(
+        lambda profile: loop.call_soon_threadsafe(schedule_push)
+    )
     yield
+    app.browser.close()
+    app.trainer.storage.close()
+    app.reporter.close()
 
 
 app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
 
+@app.middleware("http")
+async def time_request(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+
+    # labelled by route template so profile uuids don't make a series each
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    STAGE_SECONDS.observe(
+        time.perf_counter() - started,
+        stage="http",
+        method=request.method,
+        route=route,
+        status=response.status_code,
+    )
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/login")
 def login(method: str):
     pass
@@ -34,30 +105,235 @@ def login(method: str):
 env = Environment(loader=PackageLoader("web_service"), autoescape=select_autoescape())
 
 
+def profile_context(geomatch) -> dict:
+    uuid = getattr(geomatch, "uuid", None)
+    if uuid is not None:
+        img = f"/profiles/{uuid}/image"
+    else:
+        # scraped profiles have no uuid to look the image up by
+        img = unwrap_image_url(geomatch.image_urls[0])
+    return {"uuid": uuid, "name": geomatch.name, "img": img}
+
+
+def record_context(record: ProfileRecord) -> dict:
+    return {**record.as_dict(), "img": f"/profiles/{record.uuid}/image"}
+
+
 def next_match(action: SwipeAction | None = None):
+    if action is not None and (uuid := getattr(app.trainer.match, "uuid", None)):
+        app.profiles.mark_swiped(uuid, action.value)
+
     geomatch = next(app.trainer.next(action=action))
-    uuid = "test"
-    name = geomatch.name
-    img = geomatch.image_urls[0]
-    return {"uuid": uuid, "name": name, "img": img}
+    if (uuid := getattr(geomatch, "uuid", None)) and uuid not in app.profiles:
+        app.profiles.put(ProfileRecord.from_geomatch(geomatch))
+    return profile_context(geomatch)
+
+
+def swipe_profile(uuid: str | None, action: SwipeAction):
+    # swipes sent ahead by the UI are applied in order, a stale one is dropped
+    if uuid is not None and getattr(app.trainer.match, "uuid", None) != uuid:
+        logger.warning(f"profile {uuid} is not on screen, ignoring the swipe")
+        return profile_context(app.trainer.match)
+    return next_match(action)
+
+
+def prefetch_images(profiles: list):
+    # runs in a thread, the store queries sqlite and waits for room in the download queue
+    storage = app.trainer.storage
+    for profile in profiles:
+        try:
+            # re-served profiles have their images stored already
+            if not storage.is_recorded(profile.uuid):
+                storage.store_images(profile.uuid, profile.image_urls)
+        except Exception as e:
+            logger.error(f"failed to prefetch images of {profile.uuid}: {e}")
+
+
+def upcoming_profiles() -> list:
+    current = getattr(app.trainer.match, "uuid", None)
+    profiles = [
+        profile
+        for profile in app.trainer.session.recs.upcoming()
+        if profile.uuid != current
+    ][:PRELOAD_PROFILES]
+
+    # images are fetched into the store before the UI asks for them,
+    # only in-memory lookups happen on the event loop
+    if new := [profile for profile in profiles if profile.uuid not in app.prefetched]:
+        app.prefetched.update(profile.uuid for profile in new)
+        asyncio.get_running_loop().run_in_executor(None, prefetch_images, new)
+
+    return profiles
+
+
+def state_message(swiped: str | None = None) -> dict:
+    return {
+        "type": "state",
+        "swiped": swiped,
+        "current": profile_context(app.trainer.match) if app.trainer.match else None,
+        "upcoming": [profile_context(profile) for profile in upcoming_profiles()],
+    }
+
+
+async def push(message: dict):
+    for websocket in list(app.sockets):
+        try:
+            await websocket.send_json(message)
+        except (WebSocketDisconnect, RuntimeError):
+            app.sockets.discard(websocket)
+
+
+def schedule_push():
+    # a burst of new recommendations is pushed as one message
+    if app.push_scheduled:
+        return
+    app.push_scheduled = True
+
+    async def push_state():
+        app.push_scheduled = False
+        await push(state_message())
+
+    asyncio.create_task(push_state())
+
+
+async def run_browser_command(key: str, command=next_match, *args, conflicts=()):
+    try:
+        return await app.browser.run(
+            key, command, *args, timeout=COMMAND_TIMEOUT, conflicts=conflicts
+        )
+    except BrowserBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"{key} timed out")
 
 
 @app.get("/test")
-def test():
-    time.sleep(10)
+async def test():
+    await asyncio.sleep(10)
     return "123"
 
 
 @app.get("/", response_class=HTMLResponse)
-def home():
+async def home():
     profile = env.get_template("profile.html")
     base_template = env.get_template("base.html")
-    geomatch = next_match()
-    return base_template.render(profile=profile, **geomatch)
+    geomatch = await run_browser_command("current")
+
+    # the browser starts fetching the next cards' images with the page
+    preload = ", ".join(
+        f"</profiles/{upcoming.uuid}/image>; rel=preload; as=image"
+        for upcoming in upcoming_profiles()
+    )
+    return HTMLResponse(
+        base_template.render(profile=profile, **geomatch),
+        headers={"Link": preload} if preload else None,
+    )
 
 
 @app.post("/swipe/{action}", response_class=HTMLResponse)
-def swipe(request: Request, action: SwipeAction):
+async def swipe(request: Request, action: SwipeAction):
+    # a repeated click joins the swipe in progress, a different swipe is rejected
+    with catchtime("swipe to next profile"):
+        context = await run_browser_command(
+            f"swipe:{action.value}",
+            next_match,
+            action,
+            conflicts=[f"swipe:{other.value}" for other in SwipeAction],
+        )
+
     return templates.TemplateResponse(
-        request=request, name="profile.html", context=next_match(action=action)
+        request=request, name="profile.html", context=context
+    )
+
+
+async def swipe_and_push(websocket: WebSocket, uuid: str | None, action: SwipeAction):
+    # the same card swiped twice is one swipe, swipes of different cards queue up
+    try:
+        with catchtime("swipe to next profile", stage="ws_swipe"):
+            await run_browser_command(f"swipe:{uuid}", swipe_profile, uuid, action)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "uuid": uuid, "detail": e.detail})
+    await push(state_message(swiped=uuid))
+
+
+@app.websocket("/ws")
+async def profile_feed(websocket: WebSocket):
+    """
+    Push the current and upcoming profiles, receive swipes
+    without making the UI wait for the browser
+    """
+    await websocket.accept()
+    app.sockets.add(websocket)
+    try:
+        if app.trainer.match is None:
+            await run_browser_command("current")
+        await websocket.send_json(state_message())
+
+        while True:
+            message = await websocket.receive_json()
+            try:
+                action = SwipeAction(message.get("action"))
+            except ValueError:
+                await websocket.send_json(
+                    {"type": "error", "detail": f"unknown action {message}"}
+                )
+                continue
+            asyncio.create_task(swipe_and_push(websocket, message.get("uuid"), action))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        app.sockets.discard(websocket)
+
+
+@app.get("/profile/{uuid}")
+async def recent_profile(uuid: str):
+    if (record := app.profiles.get(uuid)) is None:
+        raise HTTPException(status_code=404, detail=f"{uuid} wasn't shown recently")
+    return record_context(record)
+
+
+@app.get("/history")
+async def history(limit: int = 50):
+    """
+    Recently shown profiles and how they were swiped, the last one first
+    """
+    return [record_context(record) for record in app.profiles.history(limit)]
+
+
+@app.get("/profiles/{uuid}/image")
+def profile_image(uuid: str, request: Request):
+    # image lookups query sqlite, so this runs in the threadpool
+    storage = app.trainer.storage
+    if not (hashes := storage.images.hashes(uuid)):
+        # still downloading, the browser can get the original meanwhile
+        profile = app.trainer.session.recs.get(uuid) or app.profiles.get(uuid)
+        if profile is None or not profile.image_urls:
+            raise HTTPException(status_code=404, detail=f"no image for {uuid}")
+        return RedirectResponse(
+            unwrap_image_url(profile.image_urls[0]),
+            headers={"Cache-Control": "no-store"},
+        )
+
+    path = storage.pipeline.path(hashes[0], THUMBNAIL)
+    if not path.exists():
+        path = storage.images.path(hashes[0], storage.images.ext(hashes[0]))
+
+    headers = {"ETag": f'"{path.name}"', "Cache-Control": IMAGE_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(
+        prog="web_service", description="Swipe in the browser through the web UI"
     )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    add_watchdog_arguments(parser)
+    args = parser.parse_args()
+
+    app.watchdog = watchdog_from_args(args)
+    uvicorn.run(app, host=args.host, port=args.port)